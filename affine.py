@@ -0,0 +1,82 @@
+"""2D affine transforms as 3x3 matrices working on homogeneous coordinates.
+
+The basic translate, scale and rotate matrices are cached and read-only, so building the same transform every frame
+costs a dictionary lookup. Points are passed around as (..., 2) arrays and transformed in one vectorized pass,
+whether that's a single shape or a whole batch of them with a matrix each.
+"""
+
+import functools
+import math
+import numpy as np
+import numpy.typing as npt
+
+def to_homogeneous(points: npt.ArrayLike) -> np.ndarray:
+    """(..., 2) points to (..., 3) homogeneous coordinates with w = 1"""
+    points = np.asarray(points, dtype=np.float64)
+    return np.concatenate([points, np.ones(points.shape[:-1] + (1,))], axis=-1)
+
+def from_homogeneous(coordinates: npt.ArrayLike) -> np.ndarray:
+    """(..., 3) homogeneous coordinates back to (..., 2) points"""
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    return coordinates[..., :2] / coordinates[..., 2:]
+
+def frozen(matrix: np.ndarray) -> np.ndarray:
+    matrix.flags.writeable = False
+    return matrix
+
+@functools.lru_cache(maxsize=1024)
+def translation(dx: float, dy: float) -> np.ndarray:
+    return frozen(np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=np.float64))
+
+@functools.lru_cache(maxsize=1024)
+def scaling(sx: float, sy: float) -> np.ndarray:
+    return frozen(np.array([[sx, 0, 0], [0, sy, 0], [0, 0, 1]], dtype=np.float64))
+
+@functools.lru_cache(maxsize=1024)
+def rotation(angle: float) -> np.ndarray:
+    """Rotation by `angle` radians, clockwise on screen since y points down"""
+    c, s = math.cos(angle), math.sin(angle)
+    return frozen(np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]], dtype=np.float64))
+
+def compose(*matrices: np.ndarray) -> np.ndarray:
+    """A single matrix that applies each of the matrices in turn, first to last"""
+    result = np.identity(3)
+    for matrix in matrices:
+        result = matrix @ result
+    return result
+
+@functools.lru_cache(maxsize=1024)
+def scaling_around(sx: float, sy: float, px: float, py: float) -> np.ndarray:
+    """Scale by (sx, sy) keeping the point (px, py) where it is"""
+    return frozen(compose(translation(-px, -py), scaling(sx, sy), translation(px, py)))
+
+def apply(matrix: np.ndarray, points: npt.ArrayLike) -> np.ndarray:
+    """Transform (..., 2) points by one matrix"""
+    points = np.asarray(points, dtype=np.float64)
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
+
+def apply_each(matrices: np.ndarray, shapes: npt.ArrayLike) -> np.ndarray:
+    """Transform a batch of N shapes of V points, (N, V, 2), by a matrix each, (N, 3, 3)"""
+    shapes = np.asarray(shapes, dtype=np.float64)
+    return np.einsum("nij,nvj->nvi", matrices[:, :2, :2], shapes) + matrices[:, None, :2, 2]
+
+def translations(offsets: npt.ArrayLike) -> np.ndarray:
+    """A batch of translation matrices, one per row of (N, 2) offsets"""
+    offsets = np.asarray(offsets, dtype=np.float64)
+    matrices = np.broadcast_to(np.identity(3), offsets.shape[:-1] + (3, 3)).copy()
+    matrices[..., :2, 2] = offsets
+    return matrices
+
+def scalings(factors: npt.ArrayLike) -> np.ndarray:
+    """A batch of scaling matrices, one per row of (N, 2) x and y factors"""
+    factors = np.asarray(factors, dtype=np.float64)
+    matrices = np.broadcast_to(np.identity(3), factors.shape[:-1] + (3, 3)).copy()
+    matrices[..., 0, 0] = factors[..., 0]
+    matrices[..., 1, 1] = factors[..., 1]
+    return matrices
+
+def rect_corners(rects: npt.ArrayLike) -> np.ndarray:
+    """The corners of (N, 4) x, y, width, height rects as (N, 4, 2) polygons, clockwise from the top left"""
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    x, y, w, h = rects.T
+    return np.stack([np.stack([x, y], -1), np.stack([x + w, y], -1), np.stack([x + w, y + h], -1), np.stack([x, y + h], -1)], axis=1)
@@ -0,0 +1,115 @@
+"""Shared images and masks loaded from the `res` directory.
+
+Everything under `res` is indexed by its path relative to it without the extension, e.g. "imgs/asteroid". Images
+can be decoded on a background thread at startup with `preload`, and are converted to the display's pixel format
+the first time they're asked for once the display exists. Every caller gets the same surface, so don't draw on them.
+"""
+
+import os
+import threading
+import pygame
+
+class AssetManager:
+
+    image_extensions = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tga", ".webp")
+
+    def __init__(self, root: str):
+        self.root = root
+        self.paths: dict[str, str] = {}
+
+        # Images straight from the decoder, and the ones converted for the display
+        self.decoded: dict[str, pygame.Surface] = {}
+        self.images: dict[str, pygame.Surface] = {}
+        self.masks: dict[str, pygame.mask.Mask] = {}
+
+        # Set once an image has been decoded or failed to, so lookups can wait for the preload thread
+        self.loaded: dict[str, threading.Event] = {}
+        self.errors: dict[str, Exception] = {}
+        self.preload_thread: threading.Thread | None = None
+
+        self.scan()
+
+    def scan(self):
+        """Index every image under the root directory"""
+        for directory, _, fnames in os.walk(self.root):
+            for fname in fnames:
+                stem, extension = os.path.splitext(fname)
+                if extension.lower() not in AssetManager.image_extensions:
+                    continue
+
+                key = os.path.relpath(os.path.join(directory, stem), self.root).replace(os.sep, "/")
+                self.paths[key] = os.path.join(directory, fname)
+                self.loaded.setdefault(key, threading.Event())
+
+    def preload(self):
+        """Start decoding every indexed image on a background thread"""
+        if self.preload_thread is not None:
+            return
+
+        self.preload_thread = threading.Thread(target=self.decode_all, name="asset-preload", daemon=True)
+        self.preload_thread.start()
+
+    def decode_all(self):
+        for key in list(self.paths):
+            self.decode(key)
+
+    def decode(self, key: str):
+        if self.loaded[key].is_set():
+            return
+
+        try:
+            self.decoded[key] = pygame.image.load(self.paths[key])
+        except Exception as e:
+            self.errors[key] = e
+        finally:
+            self.loaded[key].set()
+
+    def get_image(self, key: str) -> pygame.Surface:
+        image = self.images.get(key)
+        if image is not None:
+            return image
+
+        if key not in self.paths:
+            raise KeyError(f"no image {key!r} in {self.root}")
+
+        # Wait for the preload thread if it's going to get to this image, otherwise just load it now
+        if self.preload_thread is not None and self.preload_thread.is_alive():
+            self.loaded[key].wait()
+        else:
+            self.decode(key)
+
+        if key in self.errors:
+            raise self.errors[key]
+
+        image = self.decoded[key]
+
+        # Converting needs the display, so keep the decoded image until it exists
+        if pygame.display.get_surface() is None:
+            return image
+
+        if image.get_flags() & pygame.SRCALPHA:
+            image = image.convert_alpha()
+        else:
+            image = image.convert()
+
+        self.images[key] = image
+        del self.decoded[key]
+        return image
+
+    def get_mask(self, key: str) -> pygame.mask.Mask:
+        """A mask of the opaque parts of an image. It's shared too, so copy it before changing it."""
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = self.masks[key] = pygame.mask.from_surface(self.get_image(key))
+        return mask
+
+manager = AssetManager(os.path.join(os.path.dirname(os.path.abspath(__file__)), "res"))
+
+def preload():
+    manager.preload()
+
+def get_image(key: str) -> pygame.Surface:
+    return manager.get_image(key)
+
+def get_mask(key: str) -> pygame.mask.Mask:
+    return manager.get_mask(key)
@@ -0,0 +1,130 @@
+"""Destructible asteroids that get craters blasted out of them"""
+
+import numpy as np
+import pygame
+import memory
+
+class CraterBrushes:
+    """Circular masks used to blast craters, built once per radius and shared by every asteroid"""
+
+    preset_radii = (8, 12, 16, 24)
+    brushes: dict[int, pygame.mask.Mask] = {}
+
+    @staticmethod
+    def get(radius: int) -> pygame.mask.Mask:
+        brush = CraterBrushes.brushes.get(radius)
+        if brush is None:
+            brush = CraterBrushes.brushes[radius] = CraterBrushes.build(radius)
+        return brush
+
+    @staticmethod
+    def build(radius: int) -> pygame.mask.Mask:
+        size = radius * 2 + 1
+        x, y = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+        inside = x * x + y * y <= radius * radius
+
+        surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.surfarray.pixels_alpha(surface)[:] = inside * 255
+        return pygame.mask.from_surface(surface)
+
+    @staticmethod
+    def preload():
+        for radius in CraterBrushes.preset_radii:
+            CraterBrushes.get(radius)
+
+class Asteroid:
+    """An asteroid heading towards a goal, with a mask of the parts that haven't been blasted away yet.
+
+    The remaining mass is tracked from the area each crater erases instead of recounting the mask, and the
+    rendered image is only rebuilt after a hit.
+    """
+
+    # Below this fraction of its original mass the asteroid counts as destroyed and stops moving
+    destroyed_fraction = 0.05
+
+    def __init__(self, image: pygame.Surface, position: pygame.Vector2 = pygame.Vector2(), goal: pygame.Vector2 = pygame.Vector2(), speed: float = 0.0, mask: pygame.mask.Mask | None = None):
+        self.image = image
+        self.rect = image.get_rect()
+
+        # Asteroids sharing an image can pass in a copy of one mask made from it rather than each building their own
+        self.mask = pygame.mask.from_surface(image) if mask is None else mask
+        self.max_mass = self.mask.count()
+        self.mass = self.max_mass
+
+        self.position = pygame.Vector2(position)
+        self.previous_position = self.position.copy()
+        self.goal = pygame.Vector2(goal)
+        self.speed = speed
+        self.rect.center = self.position
+
+        # When this asteroid last added to its particle trail
+        self.last_particle_time = 0.0
+
+        self.rendered: pygame.Surface | None = None
+
+    @property
+    def remaining_fraction(self) -> float:
+        return self.mass / self.max_mass
+
+    @property
+    def destroyed(self) -> bool:
+        return self.remaining_fraction < Asteroid.destroyed_fraction
+
+    def move(self, delta: float):
+        self.previous_position.update(self.position)
+        self.position += (self.goal - self.position).normalize() * self.speed * delta
+        self.rect.center = self.position
+
+    def hold(self):
+        """Stay put for a step, so it's drawn where it is instead of between where it was and where it is"""
+        self.previous_position.update(self.position)
+
+    def draw_rect(self, alpha: float = 1.0) -> pygame.Rect:
+        """Where to draw the asteroid `alpha` of the way between its previous and current positions"""
+        if alpha >= 1.0:
+            return self.rect
+        return self.rect.move_to(center=self.previous_position.lerp(self.position, alpha))
+
+    def brush_offset(self, center: pygame.Vector2, radius: int) -> tuple[int, int]:
+        """Offset of a brush centered on `center` relative to the asteroid's mask"""
+        return int(center[0] - radius - self.rect.left), int(center[1] - radius - self.rect.top)
+
+    def collides(self, center: pygame.Vector2, radius: int) -> bool:
+        brush = CraterBrushes.get(radius)
+        return self.mask.overlap(brush, self.brush_offset(center, radius)) is not None
+
+    def blast(self, center: pygame.Vector2, radius: int) -> int:
+        """Blast a crater into the asteroid and return how many pixels it removed"""
+        offset = self.brush_offset(center, radius)
+        brush = CraterBrushes.get(radius)
+        erased = self.mask.overlap_area(brush, offset)
+        if erased == 0:
+            return 0
+
+        # If a ring one pixel wider than the crater is solid asteroid, the crater just makes a hole and the
+        # asteroid stays in one piece. Otherwise it might have been split, so only keep the biggest chunk.
+        ring = CraterBrushes.get(radius + 1)
+        ring_offset = (offset[0] - 1, offset[1] - 1)
+        enclosed = self.mask.overlap_area(ring, ring_offset) == ring.count()
+
+        self.mask.erase(brush, offset)
+        self.mass -= erased
+
+        if not enclosed:
+            largest = self.mask.connected_component()
+            largest_mass = largest.count()
+            if largest_mass != self.mass:
+                erased += self.mass - largest_mass
+                self.mask = largest
+                self.mass = largest_mass
+
+        # The old image goes back to the pool, where the re-render is likely to pick it up again
+        memory.pool.release(self.rendered)
+        self.rendered = None
+        return erased
+
+    def render(self) -> pygame.Surface:
+        """The asteroid image with the blasted parts cut out"""
+        if self.rendered is None:
+            self.rendered = self.mask.to_surface(memory.pool.acquire(self.image.get_size(), alpha=True), self.image, None, None, (0, 0, 0, 0))
+        return self.rendered
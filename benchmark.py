@@ -0,0 +1,297 @@
+"""Headless benchmarks that play scripted scenarios on the desktop and report frame time percentiles.
+
+Runs without a display, so it works on a plain CI box:
+
+    python benchmark.py                    # every scenario
+    python benchmark.py laser_fire impact  # just some of them
+    python benchmark.py --json results.json
+    python benchmark.py --threaded-simulation  # with particles simulated on a background thread
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# Must be set before pygame creates the display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+import assets
+import chat_support
+import chat_transport
+import desktop
+import game
+import laser_command
+import memory
+import mock_chat_server
+import program
+import simulation_worker
+
+# Every frame advances the simulation by exactly one 30 FPS tick, no matter how long it took
+DELTA = 1 / 30
+SEED = 1234
+
+class ScriptedMouse:
+    """Makes up the mouse events a real mouse would send, so scenarios can click and drag without one"""
+
+    def __init__(self):
+        self.pos = (0, 0)
+        self.pressed = False
+        self.events: list[pygame.Event] = []
+
+    def move_to(self, pos):
+        pos = (int(pos[0]), int(pos[1]))
+        rel = (pos[0] - self.pos[0], pos[1] - self.pos[1])
+        self.pos = pos
+        self.events.append(pygame.Event(pygame.MOUSEMOTION, pos=pos, rel=rel, buttons=(int(self.pressed), 0, 0)))
+
+    def press(self):
+        if not self.pressed:
+            self.pressed = True
+            self.events.append(pygame.Event(pygame.MOUSEBUTTONDOWN, pos=self.pos, button=1))
+
+    def release(self):
+        if self.pressed:
+            self.pressed = False
+            self.events.append(pygame.Event(pygame.MOUSEBUTTONUP, pos=self.pos, button=1))
+
+    def take_events(self) -> list[pygame.Event]:
+        events = self.events
+        self.events = []
+        return events
+
+class Bench:
+    """A freshly set up desktop with the same programs as the game, plus helpers for scripting it"""
+
+    def __init__(self, screen: pygame.Surface):
+        random.seed(SEED)
+        self.screen = screen
+        self.screen_rect = pygame.Rect(0, 0, *game.SCREEN_SIZE)
+        self.desktop = desktop.Desktop(self.screen_rect, dirty_tracking=True)
+        self.mouse = ScriptedMouse()
+
+        self.chat_icon = assets.get_image("imgs/ChatIcon")
+        self.laser_icon = assets.get_image("imgs/LaserIcon")
+        self.chat = self.add_program(chat_support.ChatSupport(self.chat_icon))
+        self.laser = self.add_program(laser_command.LaserCommand(self.laser_icon))
+
+    def add_program(self, new_program: program.Program) -> program.Program:
+        self.desktop.programs.append(new_program)
+        return new_program
+
+    def open_program(self, cur_program: program.Program, position: tuple[int, int] | None = None):
+        """Open a program immediately, skipping the launch animation, and focus it"""
+        if position is not None:
+            cur_program.window.position = pygame.Vector2(position)
+        cur_program.launch_program()
+        while not cur_program.open:
+            cur_program.update(DELTA)
+        self.desktop.detect_window_click(cur_program.window.rect.center)
+
+    def frame(self) -> tuple[float, float]:
+        """Run one frame and return how long the update and draw phases took"""
+        # Only the scripted events count, anything SDL queued up is thrown away
+        pygame.event.clear()
+
+        start = time.perf_counter()
+        self.desktop.handle_input(self.mouse.take_events())
+        self.desktop.update(DELTA)
+        updated = time.perf_counter()
+        updated_rects = self.desktop.draw(self.screen, self.screen_rect)
+        pygame.display.update(updated_rects)
+        drawn = time.perf_counter()
+
+        return updated - start, drawn - updated
+
+# Scenarios are generators that get a fresh bench, set it up, and then yield once before every measured frame
+
+def idle(bench: Bench):
+    """Nothing open, nobody touching anything"""
+    for _ in range(300):
+        yield
+
+def window_drag(bench: Bench):
+    """Drag the chat window back and forth over the laser game by its title bar"""
+    bench.open_program(bench.laser, (300, 40))
+    bench.open_program(bench.chat, (100, 100))
+
+    bench.mouse.move_to(bench.chat.window.title_bar_rect.midleft + pygame.Vector2(20, 0))
+    bench.mouse.press()
+    for i in range(300):
+        step = 4 if (i // 50) % 2 == 0 else -4
+        bench.mouse.move_to((bench.mouse.pos[0] + step, bench.mouse.pos[1] + step // 2))
+        yield
+    bench.mouse.release()
+
+def laser_fire(bench: Bench):
+    """Fire at the asteroid as fast as the laser recharges"""
+    laser = bench.laser
+    bench.open_program(laser, (300, 40))
+
+    for _ in range(300):
+        target = pygame.Vector2(laser.window.content_rect.topleft) + laser.asteroids[0].position
+        bench.mouse.move_to(target)
+        if laser.last_laser_time + laser.laser_interval < laser.window.open_timer:
+            bench.mouse.press()
+        else:
+            bench.mouse.release()
+        yield
+
+def impact(bench: Bench):
+    """Let the asteroid hit the ground and play the whole explosion"""
+    laser = bench.laser
+    bench.open_program(laser, (300, 40))
+
+    # Build up a trail first so the impact burst has something to push around
+    for _ in range(60):
+        yield
+    laser.asteroids[0].position.y = laser.game_rect.height - laser.asteroid_size * 1.5 - 1
+
+    frames = int((laser.explosion_length + 1) / DELTA)
+    for _ in range(frames):
+        yield
+
+def asteroid_wave(bench: Bench):
+    """A wave of hundreds of asteroids, firing at a different one every time the laser recharges"""
+    laser = bench.add_program(laser_command.LaserCommand(bench.laser_icon, wave_size=300))
+    bench.open_program(laser, (300, 40))
+
+    for _ in range(300):
+        if laser.last_laser_time + laser.laser_interval < laser.window.open_timer:
+            visible = [cur_asteroid for cur_asteroid in laser.asteroids if cur_asteroid.position.y > 0 and not cur_asteroid.destroyed]
+            if visible:
+                target = random.choice(visible).position
+                bench.mouse.move_to(pygame.Vector2(laser.window.content_rect.topleft) + target)
+            bench.mouse.press()
+        else:
+            bench.mouse.release()
+        yield
+
+def many_windows(bench: Bench):
+    """Lots of open windows stacked over each other, cycling which one is focused"""
+    windows = [bench.chat, bench.laser]
+    for i in range(22):
+        icon, program_type = (bench.chat_icon, chat_support.ChatSupport) if i % 2 == 0 else (bench.laser_icon, laser_command.LaserCommand)
+        windows.append(bench.add_program(program_type(icon)))
+
+    for i, cur_program in enumerate(windows):
+        bench.open_program(cur_program, (100 + (i % 8) * 30, 20 + (i // 8) * 30))
+
+    for i in range(300):
+        if i % 30 == 0:
+            target = windows[(i // 30) % len(windows)]
+            bench.desktop.detect_window_click(target.window.title_bar_rect.center)
+        yield
+
+def live_chat(bench: Bench):
+    """The chat taking a flood of caller messages from a local stand-in server, and answering every so often"""
+    server = mock_chat_server.MockChatServer(port=0, rate=20000, callers=500, seed=SEED)
+    transport = chat_transport.ChatTransport("127.0.0.1", server.start_in_thread())
+    transport.start()
+
+    chat = bench.chat
+    bench.open_program(chat, (100, 100))
+    chat.transport = transport
+
+    # Start with a full queue so every measured frame has traffic
+    deadline = time.perf_counter() + 5
+    while len(transport.incoming) < transport.max_incoming and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+    # The traffic comes in real time, so the frames have to be played in real time too
+    bench.mouse.move_to(chat.window.content_rect.center)
+    next_frame = time.perf_counter()
+    for i in range(150):
+        if i % 10 == 0:
+            bench.mouse.press()
+        else:
+            bench.mouse.release()
+        time.sleep(max(next_frame - time.perf_counter(), 0))
+        next_frame += DELTA
+        yield
+
+    transport.close()
+
+SCENARIOS = {
+    "idle": idle,
+    "window_drag": window_drag,
+    "laser_fire": laser_fire,
+    "impact": impact,
+    "asteroid_wave": asteroid_wave,
+    "many_windows": many_windows,
+    "live_chat": live_chat,
+}
+
+def run_scenario(name: str, screen: pygame.Surface) -> dict:
+    bench = Bench(screen)
+    update_times = []
+    draw_times = []
+    allocated = memory.pool.allocated
+    for _ in SCENARIOS[name](bench):
+        update_time, draw_time = bench.frame()
+        update_times.append(update_time)
+        draw_times.append(draw_time)
+
+    result = summarize(name, np.array(update_times), np.array(draw_times))
+    result["surface_bytes"] = bench.desktop.memory_report()["total"]
+    result["pool_allocations"] = memory.pool.allocated - allocated
+    return result
+
+def summarize(name: str, update_times: np.ndarray, draw_times: np.ndarray) -> dict:
+    def stats(times: np.ndarray) -> dict:
+        p50, p95, p99 = np.percentile(times * 1000, [50, 95, 99])
+        return {"mean": float(times.mean() * 1000), "p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(times.max() * 1000)}
+
+    return {
+        "scenario": name,
+        "frames": len(update_times),
+        "frame": stats(update_times + draw_times),
+        "update": stats(update_times),
+        "draw": stats(draw_times),
+    }
+
+def print_results(results: list[dict]):
+    print(f"{'scenario':<15}{'frames':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'update':>10}{'draw':>9}   (ms){'surfaces':>11}{'allocs':>8}")
+    for result in results:
+        frame = result["frame"]
+        print(f"{result['scenario']:<15}{result['frames']:>7}{frame['p50']:>9.2f}{frame['p95']:>9.2f}{frame['p99']:>9.2f}"
+              f"{frame['max']:>9.2f}{result['update']['mean']:>10.2f}{result['draw']['mean']:>9.2f}"
+              f"{result['surface_bytes'] / (1024 * 1024):>13.1f}M{result['pool_allocations']:>8}")
+
+def run(argv: list[str] | None = None) -> list[dict]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", metavar="scenario", help=f"scenarios to run, all of them by default ({', '.join(SCENARIOS)})")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--threaded-simulation", action="store_true", help="simulate particles on a background thread")
+    args = parser.parse_args(argv)
+
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+
+    if args.threaded_simulation:
+        simulation_worker.enable()
+
+    # The dialogue script is loaded relative to the repository root
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    pygame.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(game.SCREEN_SIZE)
+
+    results = [run_scenario(name, screen) for name in (args.scenarios or SCENARIOS)]
+    pygame.quit()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
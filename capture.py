@@ -0,0 +1,185 @@
+"""Captures every frame shown on screen to disk, cheaply enough to leave on for a whole session.
+
+Each frame is copied straight out of the display surface's pixel buffer into one of a fixed set of preallocated
+slots, which is the only copy made on the game thread. A writer thread takes the filled slots, saves them and hands
+them back. When it falls behind and every slot is still waiting to be written, frames are dropped rather than
+making the game wait, and counted. Frames where nothing on screen changed aren't copied at all, they just point back
+at the last stored frame.
+
+The default "raw" format appends the pixels as they are to one `frames.raw` file, which is fast enough to keep up.
+"png" saves a numbered image per frame instead, which is much slower to write. Either way `capture.json` says how
+to read them back and lists every frame. Raw captures can be turned into PNGs afterwards:
+
+    python main.py --capture session/
+    python capture.py session/             # write session/frame_000000.png and so on from frames.raw
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import pygame
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("raw", "png")
+
+def frame_image(data: bytes, size: tuple[int, int], pitch: int, bitsize: int, masks: tuple[int, int, int, int]) -> pygame.Surface:
+    """A surface with the captured pixels, laid out like the surface they came from but opaque, ready to save"""
+    image = pygame.Surface(size, 0, bitsize, masks)
+    buffer = image.get_buffer()
+    if image.get_pitch() == pitch:
+        buffer.write(data)
+    else:
+        row = min(pitch, image.get_pitch())
+        for y in range(size[1]):
+            buffer.write(data[y * pitch:y * pitch + row], y * image.get_pitch())
+    del buffer
+    return image
+
+class FrameCapture:
+
+    def __init__(self, directory: str, surface: pygame.Surface, format: str = "raw", slots: int = 8):
+        if format not in FORMATS:
+            raise ValueError(f"unknown capture format {format!r}, expected one of {', '.join(FORMATS)}")
+
+        self.directory = directory
+        self.format = format
+        os.makedirs(directory, exist_ok=True)
+
+        # Frames are kept exactly as they are in the surface's memory, and read back with the same layout
+        self.size = surface.get_size()
+        self.pitch = surface.get_pitch()
+        self.bitsize = surface.get_bitsize()
+        self.masks = surface.get_masks()[:3] + (0,)
+
+        # Every slot holds one whole frame. Slots go from `free` to the writer's queue and back.
+        self.slots = [bytearray(self.pitch * self.size[1]) for _ in range(slots)]
+        self.free = queue.SimpleQueue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.pending: queue.Queue[tuple[int, int] | None] = queue.Queue()
+
+        self.raw_file = open(os.path.join(directory, "frames.raw"), "wb") if format == "raw" else None
+
+        # For each captured frame its time and the stored frame it shows, or None if it was dropped
+        self.frame_times: list[float] = []
+        self.frame_images: list[int | None] = []
+        self.stored = 0
+
+        self.dropped = 0
+        self.repeated = 0
+        self.written = 0
+        self.copy_time = 0.0
+        self.write_time = 0.0
+
+        self.writer = threading.Thread(target=self.write_frames, name="capture-writer", daemon=True)
+        self.writer.start()
+
+    def capture(self, surface: pygame.Surface, updated_rects: list[pygame.Rect] | None, frame_time: float):
+        """Capture the frame that was just shown, `surface` being the one capture was set up with. With an empty list
+        of updated rects nothing changed since the last frame."""
+        self.frame_times.append(frame_time)
+
+        if updated_rects is not None and not updated_rects and self.frame_images and self.frame_images[-1] is not None:
+            self.frame_images.append(self.frame_images[-1])
+            self.repeated += 1
+            return
+
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.frame_images.append(None)
+            self.dropped += 1
+            return
+
+        # Straight from the surface's memory into the slot. The buffer keeps the surface locked until it's released.
+        start = time.perf_counter()
+        buffer = surface.get_buffer()
+        memoryview(self.slots[slot])[:] = buffer
+        del buffer
+        self.copy_time += time.perf_counter() - start
+
+        self.frame_images.append(self.stored)
+        self.pending.put((slot, self.stored))
+        self.stored += 1
+
+    def write_frames(self):
+        while (item := self.pending.get()) is not None:
+            slot, index = item
+            start = time.perf_counter()
+            try:
+                if self.raw_file is not None:
+                    self.raw_file.write(self.slots[slot])
+                else:
+                    image = frame_image(bytes(self.slots[slot]), self.size, self.pitch, self.bitsize, self.masks)
+                    pygame.image.save(image, os.path.join(self.directory, f"frame_{index:06d}.png"))
+                self.written += 1
+            except (OSError, pygame.error) as e:
+                logger.error("couldn't write captured frame %d: %s", index, e)
+            finally:
+                self.write_time += time.perf_counter() - start
+                self.free.put(slot)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "frames": len(self.frame_times),
+            "stored": self.stored,
+            "written": self.written,
+            "repeated": self.repeated,
+            "dropped": self.dropped,
+            "mean_copy_ms": self.copy_time / max(self.stored, 1) * 1000,
+            "mean_write_ms": self.write_time / max(self.written, 1) * 1000,
+        }
+
+    def close(self) -> dict:
+        """Finish writing everything that was captured and save the index, returning the stats"""
+        self.pending.put(None)
+        self.writer.join()
+        if self.raw_file is not None:
+            self.raw_file.close()
+
+        with open(os.path.join(self.directory, "capture.json"), "w") as f:
+            json.dump({
+                "format": self.format,
+                "width": self.size[0],
+                "height": self.size[1],
+                "pitch": self.pitch,
+                "bitsize": self.bitsize,
+                "masks": self.masks,
+                "frame_times": self.frame_times,
+                "frame_images": self.frame_images,
+                "stats": self.stats,
+            }, f)
+        return self.stats
+
+def export_png(directory: str) -> int:
+    """Save every frame stored in a raw capture as a PNG next to it, returning how many were saved"""
+    with open(os.path.join(directory, "capture.json")) as f:
+        index = json.load(f)
+    if index["format"] != "raw":
+        raise ValueError(f"{directory} isn't a raw capture")
+
+    size = (index["width"], index["height"])
+    frame_bytes = index["pitch"] * index["height"]
+    count = 0
+    with open(os.path.join(directory, "frames.raw"), "rb") as f:
+        while len(data := f.read(frame_bytes)) == frame_bytes:
+            image = frame_image(data, size, index["pitch"], index["bitsize"], tuple(index["masks"]))
+            pygame.image.save(image, os.path.join(directory, f"frame_{count:06d}.png"))
+            count += 1
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Turn a raw frame capture into a PNG sequence")
+    parser.add_argument("directory", help="a directory captured with main.py --capture")
+    args = parser.parse_args()
+
+    try:
+        print(f"saved {export_png(args.directory)} frames")
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
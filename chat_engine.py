@@ -0,0 +1,276 @@
+"""Runs many chat sessions over one shared, read-only dialogue graph.
+
+The compiled script holds the whole graph as arrays indexed by block, and every session is just a cursor into it:
+which block it's on, which line of that block, and where it is in its life. The cursors live in arrays owned by a
+`ChatEngine`, a few bytes each, so a whole support floor of callers can be queued up and advanced in batches.
+`Session` is a small handle onto one cursor for code that only cares about a single conversation.
+"""
+
+import numpy as np
+import dialogue_compiler
+
+# Session states
+FREE = 0
+QUEUED = 1
+ACTIVE = 2
+FINISHED = 3
+
+# Marks a missing next block or choice target, i.e. the end of the conversation. The compiled tables use the same
+# value, `dialogue_compiler.NO_BLOCK`.
+END = -1
+
+class DialogueGraph:
+    """The dialogue script flattened into arrays indexed by block position, which never change. They're read-only
+    views of the tables in the compiled file, see `dialogue_compiler.TABLES`."""
+
+    def __init__(self, dialogue: "dialogue_compiler.CompiledDialogue"):
+        self.dialogue = dialogue
+        self.block_ids = dialogue.index["id"]
+
+        self.line_start = dialogue.tables["line_start"]
+        self.choice_start = dialogue.tables["choice_start"]
+        self.next_block = dialogue.tables["next_block"]
+        self.line_strings = dialogue.tables["line_strings"]
+        self.choice_targets = dialogue.tables["choice_targets"]
+        self.choice_strings = dialogue.tables["choice_strings"]
+        self.line_counts = dialogue.tables["line_counts"]
+        self.choice_counts = dialogue.tables["choice_counts"]
+
+    def positions(self, block_ids: np.ndarray) -> np.ndarray:
+        """Block positions of some block ids, END for ids with no block"""
+        return dialogue_compiler.block_positions(self.block_ids, block_ids)
+
+    def position(self, block_id: int) -> int:
+        block = int(self.positions([block_id])[0])
+        if block == END:
+            raise KeyError(block_id)
+        return block
+
+    def line(self, block: int, line: int) -> str:
+        return self.dialogue.string(int(self.line_strings[self.line_start[block] + line]))
+
+    def choice_labels(self, block: int) -> list[str]:
+        start, end = int(self.choice_start[block]), int(self.choice_start[block + 1])
+        return [self.dialogue.string(string_id) for string_id in self.choice_strings[start:end].tolist()]
+
+class ChatEngine:
+    """Every chat session on one dialogue graph, stored as arrays of cursors.
+
+    New tickets wait in the incoming queue until they're answered. Answered sessions are advanced a line at a time
+    and moved along `[next]` links, or wait on the last line of a choice block until a choice is made. Sessions
+    that run off the end of the script are finished, and their slots are reused once closed.
+    """
+
+    def __init__(self, graph: DialogueGraph, capacity: int = 1024):
+        self.graph = graph
+        self.capacity = 0
+
+        # Per session cursor: block position, line within the block, state, and a ticket number so stale handles
+        # can tell their slot has been reused
+        self.block = np.zeros(0, dtype=np.int32)
+        self.line = np.zeros(0, dtype=np.uint16)
+        self.state = np.zeros(0, dtype=np.uint8)
+        self.ticket = np.zeros(0, dtype=np.uint32)
+        self.next_ticket = 1
+
+        # Stack of free slots, and a ring buffer of queued slots waiting to be answered
+        self.free_slots = np.zeros(0, dtype=np.int32)
+        self.free_count = 0
+        self.incoming = np.zeros(0, dtype=np.int32)
+        self.incoming_head = 0
+        self.incoming_count = 0
+
+        self.grow(max(capacity, 1))
+
+    def grow(self, capacity: int):
+        old_capacity = self.capacity
+        self.block = np.resize(self.block, capacity)
+        self.line = np.resize(self.line, capacity)
+        self.state = np.resize(self.state, capacity)
+        self.ticket = np.resize(self.ticket, capacity)
+        self.state[old_capacity:] = FREE
+
+        # Unroll the incoming ring so it starts at the front of the bigger buffer
+        queued = self.queued()
+        self.incoming = np.zeros(capacity, dtype=np.int32)
+        self.incoming[:len(queued)] = queued
+        self.incoming_head = 0
+
+        # Hand out the new slots lowest first
+        free_slots = np.zeros(capacity, dtype=np.int32)
+        free_slots[:self.free_count] = self.free_slots[:self.free_count]
+        new_slots = np.arange(capacity - 1, old_capacity - 1, -1, dtype=np.int32)
+        free_slots[self.free_count:self.free_count + len(new_slots)] = new_slots
+        self.free_slots = free_slots
+        self.free_count += len(new_slots)
+
+        self.capacity = capacity
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the session arrays"""
+        return sum(array.nbytes for array in (self.block, self.line, self.state, self.ticket, self.free_slots, self.incoming))
+
+    def allocate(self, count: int) -> np.ndarray:
+        if count > self.free_count:
+            self.grow(max(self.capacity * 2, self.capacity - self.free_count + count))
+
+        self.free_count -= count
+        slots = self.free_slots[self.free_count:self.free_count + count][::-1].copy()
+        self.ticket[slots] = np.arange(self.next_ticket, self.next_ticket + count, dtype=np.uint32)
+        self.next_ticket += count
+        return slots
+
+    def open_tickets(self, count: int, start_block_id: int = 0) -> np.ndarray:
+        """Queue up `count` new callers starting at a block and return their slots"""
+        start = self.graph.position(start_block_id)
+        slots = self.allocate(count)
+        self.block[slots] = start
+        self.line[slots] = 0
+        self.state[slots] = QUEUED
+
+        tail = (self.incoming_head + self.incoming_count + np.arange(count)) % self.capacity
+        self.incoming[tail] = slots
+        self.incoming_count += count
+        return slots
+
+    def queued(self) -> np.ndarray:
+        """Slots waiting to be answered, oldest first"""
+        return self.incoming[(self.incoming_head + np.arange(self.incoming_count)) % max(len(self.incoming), 1)]
+
+    def answer(self, count: int = 1) -> np.ndarray:
+        """Answer up to `count` of the oldest queued tickets and return their slots"""
+        count = min(count, self.incoming_count)
+        slots = self.incoming[(self.incoming_head + np.arange(count)) % self.capacity]
+        self.incoming_head = (self.incoming_head + count) % self.capacity
+        self.incoming_count -= count
+        self.state[slots] = ACTIVE
+        return slots
+
+    def start(self, start_block_id: int = 0) -> "Session":
+        """Open a ticket and answer it straight away, skipping the queue"""
+        slot = int(self.allocate(1)[0])
+        self.block[slot] = self.graph.position(start_block_id)
+        self.line[slot] = 0
+        self.state[slot] = ACTIVE
+        return Session(self, slot)
+
+    def active_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.state == ACTIVE)
+
+    def awaiting_choice(self, slots: np.ndarray) -> np.ndarray:
+        """Which of the sessions are on the last line of a block with choices"""
+        block = self.block[slots]
+        return (self.graph.choice_counts[block] > 0) & (self.line[slots] + 1 >= self.graph.line_counts[block])
+
+    def advance(self, slots: np.ndarray | None = None):
+        """Move active sessions (all of them by default) on by one line, following `[next]` links at the end of a
+        block. Sessions waiting on a choice stay where they are, and ones with nowhere to go are finished."""
+        slots = self.active_slots() if slots is None else np.asarray(slots, dtype=np.int64)
+        slots = slots[self.state[slots] == ACTIVE]
+
+        block = self.block[slots]
+        line = self.line[slots].astype(np.int32) + 1
+        at_end = line >= self.graph.line_counts[block]
+        waiting = at_end & (self.graph.choice_counts[block] > 0)
+
+        leaving = at_end & ~waiting
+        next_block = self.graph.next_block[block[leaving]]
+        leaving_slots = slots[leaving]
+        self.block[leaving_slots] = np.where(next_block == END, self.block[leaving_slots], next_block)
+        self.line[leaving_slots] = 0
+        self.state[leaving_slots[next_block == END]] = FINISHED
+
+        moving = ~at_end
+        self.line[slots[moving]] = line[moving]
+
+    def choose(self, slots: np.ndarray, choices: np.ndarray):
+        """Pick a choice (by its position in the block) for each session. Sessions that aren't waiting on a
+        choice, or get a choice their block doesn't have, are left alone."""
+        slots = np.asarray(slots, dtype=np.int64)
+        choices = np.broadcast_to(np.asarray(choices, dtype=np.int64), slots.shape)
+
+        block = self.block[slots]
+        valid = (self.state[slots] == ACTIVE) & self.awaiting_choice(slots) & (choices >= 0) & (choices < self.graph.choice_counts[block])
+        slots, block, choices = slots[valid], block[valid], choices[valid]
+
+        target = self.graph.choice_targets[self.graph.choice_start[block] + choices]
+        self.block[slots] = np.where(target == END, block, target)
+        self.line[slots] = 0
+        self.state[slots[target == END]] = FINISHED
+
+    def close(self, slots: np.ndarray):
+        """Free the slots of sessions that are done with. Queued tickets can't be closed until they're answered."""
+        slots = np.asarray(slots, dtype=np.int64)
+        slots = slots[(self.state[slots] == ACTIVE) | (self.state[slots] == FINISHED)]
+        self.state[slots] = FREE
+        self.free_slots[self.free_count:self.free_count + len(slots)] = slots
+        self.free_count += len(slots)
+
+    def session(self, slot: int) -> "Session":
+        return Session(self, slot)
+
+class Session:
+    """A handle onto one session's cursor in a `ChatEngine`"""
+
+    __slots__ = ("engine", "slot", "ticket")
+
+    def __init__(self, engine: ChatEngine, slot: int):
+        self.engine = engine
+        self.slot = slot
+        self.ticket = int(engine.ticket[slot])
+
+    @property
+    def valid(self) -> bool:
+        """False once the session has been closed and its slot possibly reused"""
+        return self.engine.state[self.slot] != FREE and int(self.engine.ticket[self.slot]) == self.ticket
+
+    @property
+    def state(self) -> int:
+        return int(self.engine.state[self.slot])
+
+    @property
+    def finished(self) -> bool:
+        return self.state == FINISHED
+
+    @property
+    def block_id(self) -> int:
+        return int(self.engine.graph.block_ids[self.engine.block[self.slot]])
+
+    @property
+    def line_index(self) -> int:
+        return int(self.engine.line[self.slot])
+
+    @property
+    def text(self) -> str:
+        block = int(self.engine.block[self.slot])
+        if self.line_index >= self.engine.graph.line_counts[block]:
+            return ""
+        return self.engine.graph.line(block, self.line_index)
+
+    @property
+    def awaiting_choice(self) -> bool:
+        return bool(self.engine.awaiting_choice(np.array([self.slot]))[0])
+
+    @property
+    def choice_labels(self) -> list[str]:
+        return self.engine.graph.choice_labels(int(self.engine.block[self.slot]))
+
+    def advance(self):
+        self.engine.advance(np.array([self.slot]))
+
+    def choose(self, choice: int):
+        self.engine.choose(np.array([self.slot]), np.array([choice]))
+
+    def close(self):
+        if self.valid:
+            self.engine.close(np.array([self.slot]))
+
+# One engine per dialogue script, shared by everything that talks through it
+engines: dict[str, ChatEngine] = {}
+
+def get_engine(dialogue_file: str) -> ChatEngine:
+    engine = engines.get(dialogue_file)
+    if engine is None:
+        engine = engines[dialogue_file] = ChatEngine(DialogueGraph(dialogue_compiler.load_dialogue(dialogue_file)))
+    return engine
@@ -0,0 +1,127 @@
+from collections import deque
+import typing
+import pygame
+import dialogue_handler
+import fonts
+import program
+import registry
+
+if typing.TYPE_CHECKING:
+    import chat_transport
+    import input_router
+
+# The chat server to take live messages from, if any, and the transport connected to it
+chat_server: tuple[str, int] | None = None
+transport: "chat_transport.ChatTransport | None" = None
+
+def configure(host: str, port: int):
+    """Take live messages from a chat server once the chat is set up"""
+    global chat_server
+    chat_server = (host, port)
+
+def shared_transport() -> "chat_transport.ChatTransport | None":
+    """The transport to the chat server, connected the first time it's asked for, or None if there's no server set"""
+    global transport
+    if chat_server is not None and transport is None:
+        # Only imported when there's a server to connect to, asyncio adds a lot to the time it takes to open the chat
+        import chat_transport
+        transport = chat_transport.ChatTransport(*chat_server)
+        transport.start()
+    return transport
+
+class ChatSupport(program.Program):
+
+    # Live messages applied in one update at most, the rest wait in the transport's queue for the next one
+    max_messages_per_update = 256
+    # How many of the latest live messages are kept around to show
+    live_history = 32
+    live_font_size = 18
+
+    def __init__(self, icon: pygame.Surface):
+        entry = registry.entry("ChatSupport")
+        program.Program.__init__(self, icon, pygame.Vector2(entry.position), entry.name, pygame.Vector2(entry.window_size))
+        self.setup_done = False
+        
+    def setup(self):
+        self.dialogue_handler = dialogue_handler.DialogueHandler("dialogue.txt")
+
+        # Messages from callers on the chat server, if there is one, as (ticket, text)
+        self.transport = shared_transport()
+        self.live_messages: deque[tuple[int, str]] = deque(maxlen=ChatSupport.live_history)
+        self.last_ticket: int | None = None
+        self.shown_status: str | None = None
+        self.setup_done = True
+        
+    def update(self, delta: float):
+        super().update(delta)
+        if not self.setup_done:
+            self.setup()
+
+        if self.transport is not None:
+            self.apply_messages(self.transport.poll(ChatSupport.max_messages_per_update))
+            if self.open and self.transport.status != self.shown_status:
+                self.mark_dirty(self.window.content_rect)
+
+    def apply_messages(self, messages: list[dict]):
+        """Add a batch of received messages to the log, skipping any that aren't shaped like a caller's message"""
+        applied = 0
+        for message in messages:
+            ticket = message.get("ticket")
+            text = message.get("text")
+            if not isinstance(ticket, int) or not isinstance(text, str):
+                continue
+            self.live_messages.append((ticket, text))
+            self.last_ticket = ticket
+            applied += 1
+
+        if applied and self.open:
+            self.mark_dirty(self.window.content_rect)
+
+    def handle_pointer(self, event: "input_router.PointerEvent"):
+        super().handle_pointer(event)
+
+        # Clicking the chat answers the latest caller with the current line of the script
+        if (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.setup_done and self.transport is not None
+                and self.last_ticket is not None and self.window.content_rect.collidepoint(event.pos)):
+            self.transport.send({"ticket": self.last_ticket, "text": self.dialogue_handler.session.text})
+        
+    def state_summary(self) -> dict:
+        summary = super().state_summary()
+        if self.setup_done:
+            summary["dialogue"] = [self.dialogue_handler.current_block_id, self.dialogue_handler.current_text_idx]
+        return summary
+
+    def draw_live_messages(self, surface: pygame.Surface, rect: pygame.Rect):
+        """The connection status and as many of the latest messages as fit, newest at the bottom"""
+        font = fonts.get_font(None, ChatSupport.live_font_size)
+        self.shown_status = self.transport.status
+        surface.blit(fonts.text_cache.render(font, self.shown_status, (120, 120, 120)), rect.topleft)
+
+        y = rect.bottom
+        for ticket, text in reversed(self.live_messages):
+            y -= font.get_linesize()
+            if y < rect.top + font.get_linesize():
+                break
+            surface.blit(fonts.text_cache.render(font, f"#{ticket} {text}", (120, 220, 120)), (rect.left + 4, y))
+
+    def draw_window(self, surface: pygame.Surface, alpha: float = 1.0):
+        super().draw_window(surface, alpha)
+        if self.open:
+            # Drawn straight onto the desktop, clipped to the content area, so the chat doesn't need a surface of its own
+            clip = surface.get_clip()
+            surface.set_clip(clip.clip(self.window.content_rect))
+            surface.fill((0, 0, 0), self.window.content_rect)
+
+            if self.transport is None:
+                self.dialogue_handler.draw_text(surface, self.window.content_rect)
+            else:
+                # The script takes the top half and the live messages the bottom
+                script_rect = self.window.content_rect.copy()
+                script_rect.height //= 2
+                live_rect = self.window.content_rect.copy()
+                live_rect.top = script_rect.bottom
+                live_rect.height -= script_rect.height
+                self.dialogue_handler.draw_text(surface, script_rect)
+                self.draw_live_messages(surface, live_rect)
+
+            surface.set_clip(clip)
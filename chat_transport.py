@@ -0,0 +1,171 @@
+"""Live chat messages to and from a chat server, without ever blocking the game loop.
+
+The socket is driven by an asyncio event loop on its own thread. Messages are newline-delimited JSON objects, from
+the server `{"ticket": 12, "text": "my screen went dark"}` for something a caller said, and the same shape back for
+an answer to that ticket.
+
+The game thread only ever touches two bounded queues. `poll` takes a batch of received messages off one, once per
+update, and `send` puts a message on the other or turns it away when it's full. When the received queue fills up
+because the game isn't keeping up, the transport stops reading from the socket until the game catches up, so TCP
+pushes back on the server instead of memory growing without end.
+
+The chat only imports this, and asyncio with it, once a server is set with `chat_support.configure`. See
+`mock_chat_server` for a server to try it with.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Connection states
+CONNECTING = "connecting"
+CONNECTED = "connected"
+DISCONNECTED = "disconnected"
+CLOSED = "closed"
+
+class ChatTransport:
+
+    def __init__(self, host: str, port: int, max_incoming: int = 4096, max_outgoing: int = 1024, reconnect_delay: float = 1.0):
+        self.host = host
+        self.port = port
+        self.max_incoming = max_incoming
+        self.max_outgoing = max_outgoing
+        self.reconnect_delay = reconnect_delay
+
+        # Appending and popping from either end of a deque is atomic, so these are shared with the game thread as is
+        self.incoming: deque[dict] = deque()
+        self.outgoing: deque[dict] = deque()
+
+        # Reading resumes as soon as the game has made a little room. Refilling in small batches keeps each burst of
+        # parsing on the transport thread short, so it doesn't hold on to the GIL while the game thread waits for it.
+        self.resume_at = max_incoming - max_incoming // 8
+        self.reading_paused = False
+
+        self.status = DISCONNECTED
+        self.received = 0
+        self.sent = 0
+        self.rejected = 0
+        self.malformed = 0
+        self.pauses = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.resume_reading = asyncio.Event()
+        self.outgoing_ready = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.thread = threading.Thread(target=self.run, name="chat-transport", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self.stay_connected())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.status = CLOSED
+            self.loop.close()
+
+    async def stay_connected(self):
+        """Connect, and reconnect whenever the connection drops, until closed"""
+        while True:
+            self.status = CONNECTING
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                logger.info("can't reach the chat server at %s:%d: %s", self.host, self.port, e)
+            else:
+                self.status = CONNECTED
+                logger.info("connected to the chat server at %s:%d", self.host, self.port)
+                await self.serve(reader, writer)
+                logger.info("lost the connection to the chat server")
+
+            self.status = DISCONNECTED
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks = [asyncio.create_task(self.read(reader)), asyncio.create_task(self.write(writer))]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logger.info("chat connection failed: %s", task.exception())
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def read(self, reader: asyncio.StreamReader):
+        while True:
+            if len(self.incoming) >= self.max_incoming:
+                self.pauses += 1
+                self.resume_reading.clear()
+                self.reading_paused = True
+                await self.resume_reading.wait()
+
+            line = await reader.readline()
+            if not line:
+                return
+
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.malformed += 1
+                continue
+            if not isinstance(message, dict):
+                self.malformed += 1
+                continue
+
+            self.incoming.append(message)
+            self.received += 1
+
+    async def write(self, writer: asyncio.StreamWriter):
+        while True:
+            await self.outgoing_ready.wait()
+            self.outgoing_ready.clear()
+
+            # Everything queued up since the last write goes out together
+            lines = []
+            while self.outgoing:
+                lines.append(json.dumps(self.outgoing.popleft()).encode("utf-8") + b"\n")
+            if lines:
+                writer.write(b"".join(lines))
+                await writer.drain()
+                self.sent += len(lines)
+
+    def poll(self, max_messages: int) -> list[dict]:
+        """Take up to `max_messages` received messages, oldest first. Called from the game thread."""
+        messages = []
+        while self.incoming and len(messages) < max_messages:
+            messages.append(self.incoming.popleft())
+
+        if self.reading_paused and len(self.incoming) <= self.resume_at and self.status != CLOSED:
+            self.reading_paused = False
+            self.loop.call_soon_threadsafe(self.resume_reading.set)
+        return messages
+
+    def send(self, message: dict) -> bool:
+        """Queue a message to send, or return False if the queue is full or the transport is closed. Called from the
+        game thread."""
+        if len(self.outgoing) >= self.max_outgoing or self.status == CLOSED:
+            self.rejected += 1
+            return False
+
+        self.outgoing.append(message)
+        self.loop.call_soon_threadsafe(self.outgoing_ready.set)
+        return True
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def close(self, timeout: float = 1.0):
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.cancel)
+            self.thread.join(timeout)
@@ -1,13 +1,19 @@
 import math
 import pygame
+import helpers
+import input_router
+import memory
+import profiler
 import program
+import registry
+import scheduler
 
 class Desktop:
     """The desktop stores references to each program, draws the icons and windows, and passes along input and signals"""
     
     background_color = (5, 144, 186)
 
-    def __init__(self, desktop_space: pygame.Rect):
+    def __init__(self, desktop_space: pygame.Rect, dirty_tracking: bool = False):
         self.programs: list[program.Program] = []
         self.rect = desktop_space
         
@@ -16,73 +22,204 @@ class Desktop:
 
         self.desktop_image = pygame.Surface(self.rect.size)
 
-        # Variables to help with dragging windows by their title bars
-        self.mouse_held = False
-        self.was_mouse_held = False
-        self.mouse_offset: pygame.Vector2 = pygame.Vector2()
-        self.inside_title = False
+        # When dirty tracking is on, only the areas the programs report as changed get redrawn and pushed to the
+        # screen. The first frame always needs a full redraw.
+        self.dirty_tracking = dirty_tracking
+        self.full_redraw = True
+        self.dirty_rects: list[pygame.Rect] = []
+
+        # Optional profiler that times the desktop and every program
+        self.profiler: profiler.Profiler | None = None
+
+        # Decides which programs get updated each step, background windows are updated less often
+        self.scheduler = scheduler.Scheduler()
+
+        # Sends mouse events to the program under the mouse, and handles focusing, icons and dragging windows
+        self.input_router = input_router.InputRouter(self)
+
+        # Bytes of surface memory to stay under by emptying the shared caches after each frame, None for no limit
+        self.memory_cap: int | None = None
 
     @property
     def focused_program(self) -> program.Program:
         return self.programs[-1]
 
-    def draw(self, surface: pygame.Surface, draw_rect: pygame.Rect):
-        self.desktop_image.fill(Desktop.background_color)
+    def profile(self, name: str) -> profiler.Section | profiler.NullSection:
+        """Time a section of the frame if profiling is on"""
+        if self.profiler is None:
+            return profiler.NULL_SECTION
+        return self.profiler.section(name)
+
+    def mark_dirty(self, rect: pygame.Rect | None = None):
+        """Request that an area of the desktop gets redrawn, or the whole thing if no rect is given"""
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self.dirty_rects.append(pygame.Rect(rect))
+
+    def draw(self, surface: pygame.Surface, draw_rect: pygame.Rect, alpha: float = 1.0) -> list[pygame.Rect]:
+        """Draw the desktop and return the areas of `surface` that changed.
+
+        `alpha` is how far the render is between the last two updates, for programs that interpolate.
+        """
+        with self.profile("Desktop.draw"):
+            updated = self.draw_desktop(surface, draw_rect, alpha)
+
+        # The background update budget covers everything between two frames
+        self.scheduler.end_frame()
+
+        if self.memory_cap is not None:
+            self.enforce_memory_cap()
+        return updated
+
+    def memory_report(self) -> dict:
+        """Bytes of surface memory held by the desktop, each program and each shared cache, and the total"""
+        programs = [{"name": cur_program.window_name, "surfaces": cur_program.surface_bytes()} for cur_program in self.programs]
+        caches = memory.cache_usage()
+        desktop_bytes = memory.surface_bytes(self.desktop_image)
+        return {
+            "desktop": desktop_bytes,
+            "programs": programs,
+            "caches": caches,
+            "total": desktop_bytes + sum(sum(usage["surfaces"].values()) for usage in programs) + sum(caches.values()),
+        }
+
+    def enforce_memory_cap(self):
+        """Empty shared caches, biggest first, until the total is back under the cap"""
+        total = self.memory_report()["total"]
+        if total > self.memory_cap:
+            with self.profile("Desktop.evict_caches"):
+                memory.evict_caches(total - self.memory_cap)
+
+    def draw_desktop(self, surface: pygame.Surface, draw_rect: pygame.Rect, alpha: float) -> list[pygame.Rect]:
+        # Always collect the dirty rects so they don't pile up when dirty tracking is off
+        dirty_rects = self.dirty_rects
+        self.dirty_rects = []
+        for cur_program in self.programs:
+            dirty_rects += cur_program.collect_dirty_rects()
+
+        # Every open and close animation is laid out together, before any of them get drawn
+        program.place_animations(self.programs)
+
+        if not self.dirty_tracking or self.full_redraw:
+            self.full_redraw = False
+            self.draw_region(self.rect, alpha)
+
+            # Draw the desktop image to the screen (or whatever surface is passed)
+            surface.blit(self.desktop_image, draw_rect)
+            return [pygame.Rect(draw_rect)]
+
+        regions = helpers.merge_rects(dirty_rects, self.rect)
+        for region in regions:
+            self.desktop_image.set_clip(region)
+            self.draw_region(region, alpha)
+        self.desktop_image.set_clip(None)
 
-        # Draw each program (both the icon and window if it should be open).
+        updated = []
+        for region in regions:
+            updated.append(surface.blit(self.desktop_image, region.move(draw_rect.topleft), region))
+        return updated
+
+    def draw_region(self, region: pygame.Rect, alpha: float):
+        """Redraw everything that overlaps `region` onto the desktop image"""
+        self.desktop_image.fill(Desktop.background_color, region)
+
+        # Draw each program (both the icon and window if it should be open) from the bottom up, clipped to the
+        # parts the open windows above it leave visible. Anything completely covered is skipped.
         # TODO: Icons should not have their own position, the desktop should assign them automatically
-        for cur_program in self.programs:
-            cur_program.draw_icon(self.desktop_image)
-            if cur_program.open or cur_program.opening or cur_program.closing:
-                cur_program.draw_window(self.desktop_image)
+        for cur_program, icon_clip, window_clip in self.visible_clips(region):
+            if icon_clip is not None:
+                self.desktop_image.set_clip(icon_clip)
+                cur_program.draw_icon(self.desktop_image)
+
+            if window_clip is not None:
+                self.desktop_image.set_clip(window_clip)
+                # Programs updated at a lower rate are just drawn as they were last updated
+                program_alpha = alpha if self.scheduler.interpolated(cur_program) else 1.0
+                with self.profile(f"{cur_program.window_name}.draw_window"):
+                    cur_program.draw_window(self.desktop_image, program_alpha)
+
+        self.desktop_image.set_clip(region)
 
         # Draw the taskbar
         pygame.draw.rect(self.desktop_image, (200, 200, 200), self.taskbar_rect)
-        
-        # Draw the desktop image to the screen (or whatever surface is passed)
-        surface.blit(self.desktop_image, draw_rect)
 
-    def update(self, delta: float):
-        self.was_mouse_held = self.mouse_held
-        self.mouse_held = pygame.mouse.get_pressed()[0]
-        move_by = pygame.mouse.get_rel() # NOTE: This function calculates based on the last time it was called. Can't really use this anywhere else without messing this up.
-        
-        # If the user clicks on the title bar and then holds down the mouse,
-        # allow them to move the window around by draggin their mouse
-        if self.mouse_held and not self.was_mouse_held and self.focused_program.window.title_bar_rect.collidepoint(pygame.mouse.get_pos()):
-            self.inside_title = True
+    def visible_clips(self, region: pygame.Rect) -> list[tuple[program.Program, pygame.Rect | None, pygame.Rect | None]]:
+        """For each program in drawing order, the areas of `region` its icon and window need drawn in, if any.
 
-        if self.mouse_held and self.was_mouse_held and self.inside_title:
-            self.focused_program.window.position += pygame.Vector2(move_by)
+        Only open windows hide what's below them, the open and close animations are just outlines.
+        """
+        clips = []
+        occluders: list[pygame.Rect] = []
+        for cur_program in reversed(self.programs):
+            window_clip = None
+            footprint = cur_program.footprint
+            if footprint is not None and footprint.colliderect(region):
+                window_clip = helpers.visible_bounds(region.clip(footprint), occluders)
 
-        if not self.mouse_held and self.was_mouse_held:
-            self.inside_title = False
+            # The icon is drawn before its own window, so that covers it too
+            if cur_program.open:
+                occluders.append(cur_program.window.rect)
 
-        # Update and handle input for each program
-        for cur_program in self.programs:
-            cur_program.handle_input()
+            icon_clip = None
+            if cur_program.icon_rect.colliderect(region):
+                icon_clip = helpers.visible_bounds(region.clip(cur_program.icon_rect), occluders)
+
+            clips.append((cur_program, icon_clip, window_clip))
+
+        clips.reverse()
+        return clips
+
+    def handle_input(self, events: list[pygame.Event]) -> list[pygame.Event]:
+        """Route the mouse events to the programs and return the events that weren't for them.
+
+        This can be called more than once a frame, e.g. again just before drawing to pick up late clicks.
+        """
+        with self.profile("Desktop.handle_input"):
+            return self.input_router.route(events)
+
+    def update(self, delta: float):
+        """Advance the simulation by one step, updating whichever programs the scheduler says are due"""
+        with self.profile("Desktop.update"):
+            self.scheduler.run(self.programs, delta, self.update_program)
+
+    def update_program(self, cur_program: program.Program, delta: float):
+        with self.profile(f"{cur_program.window_name}.update"):
             cur_program.update(delta)
 
 
-    def detect_window_click(self, pos: pygame.Vector2):
+    def launch(self, cur_program: program.Program):
+        """Open a program's window, loading the program first if only its icon has been shown so far"""
+        if isinstance(cur_program, registry.ProgramLauncher):
+            launched = cur_program.entry.create()
+            self.programs[self.programs.index(cur_program)] = launched
+            cur_program = launched
+        cur_program.launch_program()
+
+    def window_at(self, pos: pygame.Vector2) -> program.Program | None:
+        """The program with the highest open window under `pos`, if any"""
         # Since the programs are drawn in the order of their appearance in 
         # self.programs, the "topmost" and focused window should occupy the
         # last element in the array.
-        #
-        # When the user clicks on the screen, find the window they collide with
-        # that is "highest up" and make it the new focused window
-        selected = -1
-        for i, program in enumerate(self.programs):
-            program.window.focused = False
-            if program.open:
-                if program.open and program.window.rect.collidepoint(pos):
-                    selected = i
-                    
-
-        if selected == -1:
+        for cur_program in reversed(self.programs):
+            if cur_program.open and cur_program.window.rect.collidepoint(pos):
+                return cur_program
+        return None
+
+    def focus(self, selected: program.Program | None):
+        """Make a program's window the focused one and move it to the top, or unfocus everything if it's None"""
+        for cur_program in self.programs:
+            cur_program.window.focused = False
+
+        if selected is None:
             return
 
-        self.programs[selected].window.focused = True
-        first = self.programs.pop(selected)
-        self.programs.append(first)
+        selected.window.focused = True
+        self.programs.remove(selected)
+        self.programs.append(selected)
+
+    def detect_window_click(self, pos: pygame.Vector2):
+        # When the user clicks on the screen, find the window they collide with
+        # that is "highest up" and make it the new focused window
+        self.focus(self.window_at(pos))
         
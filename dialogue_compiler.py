@@ -0,0 +1,317 @@
+"""Compiles dialogue scripts into a compact indexed binary format and loads them lazily.
+
+A compiled script is cached next to its source in `__pycache__/<name>.dlgc` and memory mapped when loaded, so only
+the blocks that are actually visited ever get decoded. Scripts can also be compiled ahead of time:
+
+    python dialogue_compiler.py dialogue.txt
+
+File layout (little endian):
+
+    header       magic, version, source mtime/size/sha1, block, string, line and choice counts, section offsets
+    block index  (block id: int32, record offset: uint32) pairs sorted by block id
+    tables       the whole script flattened into arrays indexed by block position, see `TABLES`
+    records      per block: flags: uint8, has next: uint8, next id: int32, line count: uint16, choice count: uint16,
+                 then one string id (uint32) per line and (target block id: int32, string id: uint32) per choice
+    strings      (offset: uint32, length: uint32) per interned string, followed by the UTF-8 data
+
+The records are what single blocks are decoded from. The tables are what `chat_engine` runs sessions on, and are
+read straight out of the file as arrays, so loading a script costs the same however big it is.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Iterator, Mapping
+import numpy as np
+import numpy.typing as npt
+import dialogue_handler
+
+MAGIC = b"DLGC"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHHqq20sIIIIIIII")
+RECORD = struct.Struct("<BBiHH")
+CHOICE = struct.Struct("<iI")
+INDEX_DTYPE = np.dtype([("id", "<i4"), ("offset", "<u4")])
+CHOICE_DTYPE = np.dtype([("id", "<i4"), ("string", "<u4")])
+STRING_DTYPE = np.dtype([("offset", "<u4"), ("length", "<u4")])
+
+FLAG_CHOICE = 1
+
+# Block position of a missing next block or choice target
+NO_BLOCK = -1
+
+# The flattened tables in file order: name, type, and what there's one of per entry. Links are stored as block
+# positions rather than ids, so following one is a single array lookup. The 16 bit tables go last to keep the others
+# aligned.
+TABLES = [
+    ("line_start", "<u4", "block+1"),     # where each block's lines start in line_strings, plus the total at the end
+    ("choice_start", "<u4", "block+1"),   # the same for choices
+    ("next_block", "<i4", "block"),
+    ("line_strings", "<u4", "line"),
+    ("choice_targets", "<i4", "choice"),
+    ("choice_strings", "<u4", "choice"),
+    ("line_counts", "<u2", "block"),
+    ("choice_counts", "<u2", "block"),
+]
+
+def table_counts(block_count: int, line_count: int, choice_count: int) -> dict[str, int]:
+    return {"block": block_count, "block+1": block_count + 1, "line": line_count, "choice": choice_count}
+
+def block_positions(block_ids: np.ndarray, ids: npt.ArrayLike) -> np.ndarray:
+    """Positions of some block ids in the sorted `block_ids`, NO_BLOCK for ids with no block"""
+    ids = np.asarray(ids, dtype=np.int64)
+    found = np.searchsorted(block_ids, ids)
+    found = np.minimum(found, max(len(block_ids) - 1, 0))
+    exists = (len(block_ids) > 0) & (block_ids[found] == ids)
+    return np.where(exists, found, NO_BLOCK).astype(np.int32)
+
+class DialogueSyntaxError(ValueError):
+    pass
+
+def parse_source(lines) -> tuple[dict[int, list], list[str]]:
+    """Parse a dialogue script into blocks of interned string ids.
+
+    Returns a dict of block id to [is choice, next id or None, line string ids, (choice id, string id) pairs],
+    and the list of interned strings.
+    """
+    blocks: dict[int, list] = {}
+    strings: list[str] = []
+    string_ids: dict[str, int] = {}
+
+    def intern(text: str) -> int:
+        string_id = string_ids.get(text)
+        if string_id is None:
+            string_id = string_ids[text] = len(strings)
+            strings.append(text)
+        return string_id
+
+    current_block = None
+    for line_number, line in enumerate(lines, 1):
+        try:
+            if line.startswith('[start]'):
+                block_id = int(line.removeprefix('[start] '))
+                if (current_block := blocks.get(block_id)) is None:
+                    current_block = blocks[block_id] = [False, None, [], []]
+
+            elif line.startswith('[choice]'):
+                new_id, text = line.removeprefix('[choice] ').split(',', 1)
+                current_block[3].append((int(new_id), intern(text.strip())))
+
+            elif line.startswith('[next]'):
+                current_block[1] = int(line.removeprefix('[next] '))
+
+            elif line.startswith('[end]'):
+                pass
+
+            elif line in ['\n', '\r\n']:
+                pass
+
+            else:
+                current_block[2].append(intern(line.strip()))
+
+        except (ValueError, TypeError) as e:
+            raise DialogueSyntaxError(f"line {line_number}: {line.strip()!r}") from e
+
+    return blocks, strings
+
+def compile_dialogue(source_path: str) -> bytes:
+    """Compile a dialogue script and return the compiled file contents"""
+    with open(source_path, "rb") as f:
+        source = f.read()
+    stat = os.stat(source_path)
+
+    blocks, strings = parse_source(source.decode("utf-8").splitlines(keepends=True))
+
+    block_ids = np.array(sorted(blocks), dtype=np.int32)
+    records = bytearray()
+    index = np.zeros(len(blocks), dtype=INDEX_DTYPE)
+    line_ids = []
+    next_ids = []
+    choice_ids = []
+    choice_string_ids = []
+    line_counts = np.zeros(len(blocks), dtype=np.uint16)
+    choice_counts = np.zeros(len(blocks), dtype=np.uint16)
+    for i, block_id in enumerate(block_ids.tolist()):
+        is_choice, next_id, block_line_ids, choices = blocks[block_id]
+        index[i] = (block_id, len(records))
+        records += RECORD.pack(FLAG_CHOICE if is_choice else 0, next_id is not None, next_id or 0, len(block_line_ids), len(choices))
+        records += struct.pack(f"<{len(block_line_ids)}I", *block_line_ids)
+        for choice_id, string_id in choices:
+            records += CHOICE.pack(choice_id, string_id)
+
+        line_ids += block_line_ids
+        next_ids.append(next_id)
+        choice_ids += [choice_id for choice_id, _ in choices]
+        choice_string_ids += [string_id for _, string_id in choices]
+        line_counts[i] = len(block_line_ids)
+        choice_counts[i] = len(choices)
+
+    has_next = np.array([next_id is not None for next_id in next_ids], dtype=bool)
+    next_block = block_positions(block_ids, [next_id or 0 for next_id in next_ids])
+    tables = {
+        "line_start": np.concatenate([[0], np.cumsum(line_counts, dtype=np.uint32)]),
+        "choice_start": np.concatenate([[0], np.cumsum(choice_counts, dtype=np.uint32)]),
+        "next_block": np.where(has_next, next_block, NO_BLOCK),
+        "line_strings": np.array(line_ids, dtype=np.uint32),
+        "choice_targets": block_positions(block_ids, choice_ids),
+        "choice_strings": np.array(choice_string_ids, dtype=np.uint32),
+        "line_counts": line_counts,
+        "choice_counts": choice_counts,
+    }
+    table_data = b"".join(tables[name].astype(dtype).tobytes() for name, dtype, _ in TABLES)
+
+    encoded = [text.encode("utf-8") for text in strings]
+    string_table = np.zeros(len(encoded), dtype=STRING_DTYPE)
+    string_table["length"] = [len(data) for data in encoded]
+    if len(encoded) > 0:
+        string_table["offset"][1:] = np.cumsum(string_table["length"])[:-1]
+
+    index_offset = HEADER.size
+    tables_offset = index_offset + index.nbytes
+    records_offset = tables_offset + len(table_data)
+    strings_offset = records_offset + len(records)
+    header = HEADER.pack(MAGIC, VERSION, 0, stat.st_mtime_ns, stat.st_size, hashlib.sha1(source).digest(),
+                         len(blocks), len(strings), len(line_ids), len(choice_ids),
+                         index_offset, tables_offset, records_offset, strings_offset)
+
+    return b"".join([header, index.tobytes(), table_data, bytes(records), string_table.tobytes(), *encoded])
+
+class CompiledDialogue(Mapping):
+    """Read-only mapping of block id to `DialogueBlock`, decoded lazily from a compiled script"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        (magic, version, _, self.source_mtime_ns, self.source_size, self.source_hash, self.block_count,
+         self.string_count, self.line_count, self.choice_count, index_offset, tables_offset, self.records_offset,
+         strings_offset) = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a compiled dialogue file, or compiled by a different version")
+
+        self.index = np.frombuffer(buffer, dtype=INDEX_DTYPE, count=self.block_count, offset=index_offset)
+
+        # Read-only views of the flattened tables, nothing is decoded until it's used
+        counts = table_counts(self.block_count, self.line_count, self.choice_count)
+        self.tables: dict[str, np.ndarray] = {}
+        for name, dtype, per in TABLES:
+            self.tables[name] = np.frombuffer(buffer, dtype=dtype, count=counts[per], offset=tables_offset)
+            tables_offset += self.tables[name].nbytes
+        self.string_table = np.frombuffer(buffer, dtype=STRING_DTYPE, count=self.string_count, offset=strings_offset)
+        self.string_data_offset = strings_offset + self.string_table.nbytes
+
+        self.blocks: dict[int, dialogue_handler.DialogueBlock] = {}
+
+    @staticmethod
+    def from_file(fname: str) -> "CompiledDialogue":
+        with open(fname, "rb") as f:
+            return CompiledDialogue(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def string(self, string_id: int) -> str:
+        offset, length = self.string_table[string_id]
+        start = self.string_data_offset + int(offset)
+        return bytes(self.buffer[start:start + int(length)]).decode("utf-8")
+
+    def find(self, block_id: int) -> int:
+        """Return the record offset of a block, or -1 if there isn't one"""
+        i = int(np.searchsorted(self.index["id"], block_id))
+        if i < self.block_count and self.index["id"][i] == block_id:
+            return self.records_offset + int(self.index["offset"][i])
+        return -1
+
+    def record(self, offset: int) -> tuple[int, int | None, np.ndarray, np.ndarray]:
+        """Decode the record at `offset` into its flags, next block id, line string ids and choices, without
+        looking up any strings. The arrays are views into the compiled file."""
+        flags, has_next, next_id, line_count, choice_count = RECORD.unpack_from(self.buffer, offset)
+        offset += RECORD.size
+        line_ids = np.frombuffer(self.buffer, dtype="<u4", count=line_count, offset=offset)
+        offset += line_ids.nbytes
+        choices = np.frombuffer(self.buffer, dtype=CHOICE_DTYPE, count=choice_count, offset=offset)
+        return flags, next_id if has_next else None, line_ids, choices
+
+    def __getitem__(self, block_id: int) -> "dialogue_handler.DialogueBlock":
+        block = self.blocks.get(block_id)
+        if block is not None:
+            return block
+
+        offset = self.find(block_id)
+        if offset == -1:
+            raise KeyError(block_id)
+
+        flags, next_id, line_ids, choices = self.record(offset)
+
+        block = dialogue_handler.DialogueBlock(block_id, bool(flags & FLAG_CHOICE))
+        block.lines = [self.string(string_id) for string_id in line_ids.tolist()]
+        block.choices = choices["id"].tolist()
+        block.choice_labels = [self.string(string_id) for string_id in choices["string"].tolist()]
+        block.next = next_id
+
+        self.blocks[block_id] = block
+        return block
+
+    def __contains__(self, block_id) -> bool:
+        return self.find(block_id) != -1
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.index["id"].tolist())
+
+    def __len__(self) -> int:
+        return self.block_count
+
+def cache_path(source_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(source_path))
+    return os.path.join(directory, "__pycache__", name + ".dlgc")
+
+def is_current(compiled_path: str, source_path: str) -> bool:
+    """Check a compiled file against its source, comparing the hash only if the mtime or size changed"""
+    try:
+        with open(compiled_path, "rb") as f:
+            header = f.read(HEADER.size)
+        magic, version, _, mtime_ns, size, source_hash, *_ = HEADER.unpack(header)
+    except (OSError, struct.error):
+        return False
+
+    if magic != MAGIC or version != VERSION:
+        return False
+
+    stat = os.stat(source_path)
+    if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+        return True
+
+    with open(source_path, "rb") as f:
+        if hashlib.sha1(f.read()).digest() != source_hash:
+            return False
+
+    # Same contents with a new mtime (e.g. a fresh checkout), so record the new mtime to skip hashing next time
+    try:
+        with open(compiled_path, "r+b") as f:
+            f.seek(struct.calcsize("<4sHH"))
+            f.write(struct.pack("<qq", stat.st_mtime_ns, stat.st_size))
+    except OSError:
+        pass
+    return True
+
+def load_dialogue(source_path: str) -> CompiledDialogue:
+    """Load a dialogue script, compiling it first if there is no up to date compiled copy"""
+    compiled_path = cache_path(source_path)
+    if is_current(compiled_path, source_path):
+        return CompiledDialogue.from_file(compiled_path)
+
+    compiled = compile_dialogue(source_path)
+    try:
+        os.makedirs(os.path.dirname(compiled_path), exist_ok=True)
+        temp_path = f"{compiled_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(compiled)
+        os.replace(temp_path, compiled_path)
+    except OSError:
+        # Can't cache it, so just use the compiled copy from memory
+        return CompiledDialogue(compiled)
+
+    return CompiledDialogue.from_file(compiled_path)
+
+if __name__ == "__main__":
+    for source_path in sys.argv[1:]:
+        dialogue = load_dialogue(source_path)
+        print(f"{source_path}: {len(dialogue)} blocks, {dialogue.string_count} strings -> {cache_path(source_path)}")
@@ -1,5 +1,6 @@
-import os
 import pygame
+import chat_engine
+import fonts
 
 class DialogueBlock:
     
@@ -9,6 +10,7 @@ class DialogueBlock:
         self.lines = []
         # Either a next will not be none or choices will be populated?
         self.choices = []
+        self.choice_labels = []
         self.next = None
         
     def add_line(self, line):
@@ -26,62 +28,21 @@ class DialogueHandler:
     
     def __init__(self, dialogue_file: str, font: pygame.font.Font | None = None):
         
-        self.font = None
-        if pygame.font.get_init():
-            if font is None:
-                self.font = pygame.font.SysFont(None, DialogueHandler.font_size)
+        self.font = font
+        if self.font is None and pygame.font.get_init():
+            self.font = fonts.get_font(None, DialogueHandler.font_size)
         
         assert dialogue_file is not None
-        self.parse_dialogue_file(dialogue_file)
+        # The script is compiled and flattened once and shared by every conversation, this handler only owns a
+        # cursor into it. See `chat_engine`.
+        self.engine = chat_engine.get_engine(dialogue_file)
+        self.dialogue_blocks = self.engine.graph.dialogue
 
-        self.current_block_id = 0
-        assert self.dialogue_blocks.get(self.current_block_id) is not None
+        assert self.dialogue_blocks.get(0) is not None
+        self.session = self.engine.start(0)
 
-        self.current_text_idx = 0
-        assert len(self.dialogue_blocks.get(self.current_block_id).lines) > 0
+        assert len(self.current_block.lines) > 0
 
-    def parse_dialogue_file(self, fname: str):
-        self.dialogue_blocks = {}
-        current_block = None
-        with open(fname) as f:
-            # Assume the first line is the start of a new block    
-            while (line := f.readline()) != '':
-                # print(repr(line))
-                if line.startswith('[start]'):
-                    block_id = line.removeprefix('[start] ')
-                    block_id_int = int(block_id)
-                    if (current_block := self.dialogue_blocks.get(block_id_int)) is None:
-                        current_block = DialogueBlock(block_id_int)
-                        self.dialogue_blocks[block_id_int] = current_block
-
-                    print(f"Starting block {block_id_int}")
-
-                elif line.startswith('[choice]'):
-                    data = line.removeprefix('[choice] ')
-                    new_id, text = data.split(',', 1)
-                    new_id_int = int(new_id)
-                    if (next_block := self.dialogue_blocks.get(new_id_int)) is None: # This should always be true, when would we add another line to as a choice to a block?
-                        next_block = DialogueBlock(new_id_int, True)
-                        next_block.add_line(text)
-
-                    current_block.choices.append(new_id_int)
-
-                elif line.startswith('[next]'):
-                    data = line.removeprefix('[next] ')
-                    current_block.next = int(data)
-
-                elif line.startswith('[end]'):
-                    pass
-
-                elif line in ['\n', '\r\n']:
-                    pass
-
-                else:
-                    current_block.add_line(line.strip())
-    
-        print(self.dialogue_blocks)
-
-    
     def update(self, delta: float):
         pass
     
@@ -89,10 +50,22 @@ class DialogueHandler:
         """Draws the current dialogue block"""
         pygame.draw.rect(surface, (255, 0, 0), text_rect, 2)
 
-        current_text = self.current_block.lines[self.current_block_id]
-        rendered_text = self.font.render(current_text, True, (255, 255, 255))
-        surface.blit(rendered_text, text_rect)
+        # Both the wrapping and the rendered lines are cached, so this only renders when the text changes
+        current_text = self.session.text
+        y = text_rect.top
+        for line in fonts.text_cache.wrap(self.font, current_text, text_rect.width):
+            rendered_text = fonts.text_cache.render(self.font, line, (255, 255, 255))
+            surface.blit(rendered_text, (text_rect.left, y))
+            y += self.font.get_linesize()
     
+    @property
+    def current_block_id(self) -> int:
+        return self.session.block_id
+
+    @property
+    def current_text_idx(self) -> int:
+        return self.session.line_index
+
     @property
     def current_block(self) -> DialogueBlock:
         return self.dialogue_blocks[self.current_block_id]
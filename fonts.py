@@ -0,0 +1,81 @@
+"""Shared fonts and a cache of rendered text.
+
+`pygame.font.SysFont` scans the system fonts every time it's called, so every face/size is only ever resolved once
+here and shared. Rendered text and word-wrapped layouts are cached so that text which doesn't change between frames
+is only rendered once.
+"""
+
+from collections import OrderedDict
+import pygame
+import memory
+
+fonts: dict[tuple[str | None, int], pygame.font.Font] = {}
+
+def get_font(name: str | None, size: int) -> pygame.font.Font:
+    """Return the shared font for a face and size, where a name of None is pygame's default font"""
+    font = fonts.get((name, size))
+    if font is None:
+        assert pygame.font.get_init()
+        font = fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+class TextCache:
+    """LRU cache of rendered text surfaces bounded by their total pixel memory, plus wrapped layouts per width"""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, max_layouts: int = 1024):
+        self.max_bytes = max_bytes
+        self.max_layouts = max_layouts
+        self.bytes = 0
+        self.surfaces: OrderedDict[tuple, pygame.Surface] = OrderedDict()
+        self.layouts: OrderedDict[tuple, tuple[str, ...]] = OrderedDict()
+
+    def render(self, font: pygame.font.Font, text: str, color, antialias: bool = True) -> pygame.Surface:
+        """Same as `font.render`, but returns a shared surface that must not be drawn on"""
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        self.bytes += memory.surface_bytes(surface)
+
+        # Always keep the newest surface even if it's bigger than the whole budget
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.bytes -= memory.surface_bytes(evicted)
+
+        return surface
+
+    def wrap(self, font: pygame.font.Font, text: str, width: int) -> tuple[str, ...]:
+        """Split text into lines that fit within `width` pixels, breaking on spaces where possible"""
+        key = (font, text, width)
+        lines = self.layouts.get(key)
+        if lines is not None:
+            self.layouts.move_to_end(key)
+            return lines
+
+        lines = []
+        current = ""
+        for word in text.split(" "):
+            candidate = f"{current} {word}" if current else word
+            if current and font.size(candidate)[0] > width:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+        lines.append(current)
+
+        lines = self.layouts[key] = tuple(lines)
+        if len(self.layouts) > self.max_layouts:
+            self.layouts.popitem(last=False)
+        return lines
+
+    def clear(self):
+        self.surfaces.clear()
+        self.layouts.clear()
+        self.bytes = 0
+
+text_cache = TextCache()
+memory.register_cache("text", lambda: text_cache.bytes, text_cache.clear)
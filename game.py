@@ -0,0 +1,43 @@
+"""Setting up a game and stepping it through a frame, shared by the game loop in `main` and replays in `replay`."""
+
+import math
+import random
+import pygame
+import desktop
+import registry
+import timestep
+
+SCREEN_SIZE = WIDTH, HEIGHT = (640, 480)
+
+# The simulation always runs at 30 steps per second to give a more old school feel, however fast it renders
+SIMULATION_RATE = 30
+MAX_CATCH_UP_STEPS = 5
+
+def new_game(seed: int, deterministic: bool = False, wave_size: int = 1) -> tuple[desktop.Desktop, timestep.FixedTimestep]:
+    """Seed the random numbers and set up the desktop with every program's icon on it, as the game starts. The
+    programs themselves are only loaded when they're first launched.
+
+    A `deterministic` game always gives background programs their updates instead of skipping them when they go
+    over the CPU budget, so it plays out the same every time it gets the same input. Recordings need this.
+    `wave_size` is how many asteroids Laser Command sends down at once.
+    """
+    random.seed(seed)
+    registry.configure("LaserCommand", wave_size=wave_size)
+
+    # Only redraw and present the parts of the screen that change each frame
+    its_desktop = desktop.Desktop(pygame.Rect(0, 0, *SCREEN_SIZE), dirty_tracking=True)
+    if deterministic:
+        its_desktop.scheduler.budget = math.inf
+    its_desktop.programs.extend(registry.launchers())
+
+    return its_desktop, timestep.FixedTimestep(1 / SIMULATION_RATE, MAX_CATCH_UP_STEPS)
+
+def simulate_frame(its_desktop: desktop.Desktop, simulation_clock: timestep.FixedTimestep, frame_time: float, events: list[pygame.Event]) -> list[pygame.Event]:
+    """Route a frame's events and run however many simulation steps `frame_time` is worth.
+
+    Returns the events the desktop didn't want. Shared by the game loop and replays so both do exactly the same.
+    """
+    unrouted = its_desktop.handle_input(events)
+    for _ in range(simulation_clock.advance(frame_time)):
+        its_desktop.update(simulation_clock.step)
+    return unrouted
@@ -0,0 +1,54 @@
+"""Color gradients precomputed into lookup tables.
+
+Every gradient is a start and end color registered once with the shared `palette`, which bakes it into a row of
+`steps` colors and hands back an id. Looking up colors is then indexing the table, either one color at a time or a
+whole array of gradient ids and times at once, instead of interpolating every color separately.
+"""
+
+import numpy as np
+import numpy.typing as npt
+
+class Palette:
+    """Lookup tables for every registered gradient, stacked into one (gradients, steps, 3) array"""
+
+    def __init__(self, steps: int = 256):
+        self.steps = steps
+        self.ids: dict[tuple, int] = {}
+        self.table = np.zeros((0, steps, 3), dtype=np.uint8)
+
+    def add(self, start: tuple[int, int, int], end: tuple[int, int, int]) -> int:
+        """Register a gradient if it isn't already and return its id"""
+        key = (tuple(int(c) for c in start[:3]), tuple(int(c) for c in end[:3]))
+        gradient_id = self.ids.get(key)
+        if gradient_id is not None:
+            return gradient_id
+
+        t = np.linspace(0.0, 1.0, self.steps)[:, None]
+        start_color, end_color = np.array(key, dtype=np.float64)
+        row = np.rint(start_color + (end_color - start_color) * t).astype(np.uint8)
+
+        gradient_id = self.ids[key] = len(self.table)
+        self.table = np.concatenate([self.table, row[None]])
+        return gradient_id
+
+    def lookup(self, gradient_ids: npt.ArrayLike, t: npt.ArrayLike, out: np.ndarray | None = None) -> np.ndarray:
+        """(N, 3) colors for arrays of gradient ids and times, with times clamped like `helpers.lerp_rgb`"""
+        # Index the table as one flat list of colors, which is a lot faster than indexing it in two dimensions.
+        # Adding a half before truncating rounds to the nearest step, since the times are never negative.
+        index = (np.clip(t, 0.0, 1.0) * (self.steps - 1) + 0.5).astype(np.intp)
+        index += np.asarray(gradient_ids, dtype=np.intp) * self.steps
+        return np.take(self.table.reshape(-1, 3), index, axis=0, out=out)
+
+    def color(self, gradient_id: int, t: float) -> tuple[int, int, int]:
+        column = int(min(max(t, 0.0), 1.0) * (self.steps - 1) + 0.5)
+        r, g, b = self.table[gradient_id, column].tolist()
+        return r, g, b
+
+# Shared by everything so each gradient only gets baked once
+palette = Palette()
+
+def get(start: tuple[int, int, int], end: tuple[int, int, int]) -> int:
+    return palette.add(start, end)
+
+def color(gradient_id: int, t: float) -> tuple[int, int, int]:
+    return palette.color(gradient_id, t)
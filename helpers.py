@@ -1,9 +1,11 @@
 """Helper functions that can be used in any file"""
 
 import random
+import typing
 import pygame
-import numpy as np
-import numpy.typing as npt
+
+if typing.TYPE_CHECKING:
+    import numpy.typing as npt
 
 def adjust_brightness_rgb(r: int, g: int, b: int, t: float) -> tuple[int, int, int]:
     return tuple(map(lambda x : int(min(max(x, 0), 255)), pygame.Vector3(r, g, b) * t))
@@ -21,6 +23,48 @@ def bottom_edge_rect(rect: pygame.rect.FRect) -> pygame.rect.FRect:
 def bottom_edge_line(rect: pygame.rect.FRect) -> tuple[pygame.Vector2, pygame.Vector2]:
     return pygame.Vector2(rect.bottomleft), pygame.Vector2(rect.bottomright)
 
+def merge_rects(rects: list[pygame.Rect], bounds: pygame.Rect) -> list[pygame.Rect]:
+    """Clip each rect to the bounds and union any that overlap, so no area ends up in more than one rect"""
+    merged: list[pygame.Rect] = []
+    for rect in rects:
+        rect = pygame.Rect(rect).clip(bounds)
+        if rect.width == 0 or rect.height == 0:
+            continue
+
+        # Growing a rect can make it overlap ones it didn't before, so keep going until nothing collides
+        while (i := rect.collidelist(merged)) != -1:
+            rect.union_ip(merged.pop(i))
+        merged.append(rect)
+
+    return merged
+
+def subtract_rect(rect: pygame.Rect, hole: pygame.Rect) -> list[pygame.Rect]:
+    """The parts of `rect` not covered by `hole`, as up to four non-overlapping rects"""
+    overlap = rect.clip(hole)
+    if overlap.width == 0 or overlap.height == 0:
+        return [rect]
+
+    pieces = []
+    # Full width strips above and below the hole, then whatever is left at its sides
+    if overlap.top > rect.top:
+        pieces.append(pygame.Rect(rect.left, rect.top, rect.width, overlap.top - rect.top))
+    if overlap.bottom < rect.bottom:
+        pieces.append(pygame.Rect(rect.left, overlap.bottom, rect.width, rect.bottom - overlap.bottom))
+    if overlap.left > rect.left:
+        pieces.append(pygame.Rect(rect.left, overlap.top, overlap.left - rect.left, overlap.height))
+    if overlap.right < rect.right:
+        pieces.append(pygame.Rect(overlap.right, overlap.top, rect.right - overlap.right, overlap.height))
+    return pieces
+
+def visible_bounds(rect: pygame.Rect, occluders: list[pygame.Rect]) -> pygame.Rect | None:
+    """The bounding box of the parts of `rect` no occluder covers, or None if it's completely covered"""
+    pieces = [rect]
+    for occluder in occluders:
+        pieces = [piece for cur_piece in pieces for piece in subtract_rect(cur_piece, occluder)]
+        if not pieces:
+            return None
+    return pieces[0].unionall(pieces[1:])
+
 def random_hue(saturation: float, value: float) -> pygame.Color:
     return pygame.Color.from_hsva(random.uniform(0, 360), saturation, value, 100.0)
 
@@ -35,19 +79,19 @@ def random_gray() -> pygame.Color:
 def random_vector2(scale: float):
     return pygame.Vector2(random.uniform(-scale, scale), random.uniform(-scale, scale))
 
-def scale_around_point(coordinates: list[pygame.Vector2], scale_factor: float, point: pygame.Vector2):
-    coord_matrix = np.array(coordinates, dtype=np.float32)
-    translate_matrix_1 = np.array([[-point.x + 1, -point.y], [-point.x, -point.y + 1]], dtype=np.float32)
-    translate_matrix = np.array([[point.x + 1, point.y], [point.x, point.y + 1]], dtype=np.float32)
-
-    scale_matrix = np.array([[scale_factor, 0], [0, scale_factor]], dtype=np.float32)
-    return (translate_matrix @ scale_matrix @ translate_matrix_1 @ coord_matrix.T).T
+def scale_around_point(coordinates: list[pygame.Vector2], scale_factor: float, point: pygame.Vector2) -> "npt.NDArray":
+    """Scale the coordinates by `scale_factor` away from (or towards) `point`, see `affine` for batches of shapes"""
+    # These are the only helpers that need NumPy, so it's only imported once they get used
+    import affine
+    return affine.apply(affine.scaling_around(scale_factor, scale_factor, point[0], point[1]), coordinates)
 
-def convert_cartesian_to_homogenous(coordinates: list[pygame.Vector2]) -> npt.NDArray:
-    pass
+def convert_cartesian_to_homogenous(coordinates: list[pygame.Vector2]) -> "npt.NDArray":
+    import affine
+    return affine.to_homogeneous(coordinates)
 
-def convert_homogenous_to_cargesian(coordinates: npt.NDArray) -> list[pygame.Vector2]:
-    pass
+def convert_homogenous_to_cargesian(coordinates: "npt.NDArray") -> list[pygame.Vector2]:
+    import affine
+    return [pygame.Vector2(point) for point in affine.from_homogeneous(coordinates).tolist()]
 
 if __name__ == "__main__":
     coord_a = pygame.Vector2(0, 5)
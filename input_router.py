@@ -0,0 +1,98 @@
+"""Routes mouse events from the pygame event queue to the program they belong to.
+
+Each event is hit-tested once against the open windows from the top down, then the icons, and only the program it
+lands on hears about it. A program that gets a button press captures the pointer until the button is released, so
+drags keep going to it even when the mouse leaves its window.
+"""
+
+import pygame
+import desktop
+import program
+
+class PointerEvent:
+    """A mouse event delivered to a program. `type` is the pygame event type it came from."""
+
+    __slots__ = ("type", "pos", "local_pos", "button", "rel")
+
+    def __init__(self, event: pygame.Event, target: "program.Program"):
+        self.type = event.type
+        self.pos = pygame.Vector2(event.pos)
+        # Relative to the top left of the window's content area
+        self.local_pos = self.pos - pygame.Vector2(target.window.content_rect.topleft)
+        self.button = getattr(event, "button", 0)
+        self.rel = pygame.Vector2(getattr(event, "rel", (0, 0)))
+
+class InputRouter:
+
+    pointer_events = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION)
+
+    def __init__(self, its_desktop: "desktop.Desktop"):
+        self.desktop = its_desktop
+
+        # The program that was pressed on, while the button is held, and whether it's being dragged by its title bar
+        self.captured: "program.Program | None" = None
+        self.dragging = False
+
+    def route(self, events: list[pygame.Event]) -> list[pygame.Event]:
+        """Dispatch the mouse events and return the rest for the caller to handle"""
+        unhandled = []
+        for event in events:
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self.press(event)
+            elif event.type == pygame.MOUSEBUTTONUP:
+                self.release(event)
+            elif event.type == pygame.MOUSEMOTION:
+                self.motion(event)
+            else:
+                unhandled.append(event)
+        return unhandled
+
+    def press(self, event: pygame.Event):
+        target = self.desktop.window_at(event.pos)
+
+        if event.button == 1:
+            self.desktop.focus(target)
+            # Windows are on top of the icons, so an icon only gets clicked if there's no window in the way
+            self.click_icons(None if target is not None else event.pos)
+
+        if target is None:
+            return
+
+        self.captured = target
+        self.deliver(target, event)
+
+        # Clicking the title bar starts dragging the window, unless the click closed it
+        if event.button == 1 and target.open and target.window.title_bar_rect.collidepoint(event.pos):
+            self.dragging = True
+
+    def deliver(self, target: "program.Program", event: pygame.Event):
+        with self.desktop.profile(f"{target.window_name}.handle_pointer"):
+            target.handle_pointer(PointerEvent(event, target))
+
+    def click_icons(self, pos: tuple[int, int] | None):
+        """Select the icon at `pos`, or launch it if it's already selected, and deselect every other icon"""
+        for cur_program in self.desktop.programs:
+            if pos is not None and not cur_program.open and not cur_program.opening and cur_program.icon_rect.collidepoint(pos):
+                if cur_program.selected:
+                    cur_program.selected = False
+                    self.desktop.launch(cur_program)
+                else:
+                    cur_program.selected = True
+            else:
+                cur_program.selected = False
+
+    def release(self, event: pygame.Event):
+        target = self.captured or self.desktop.window_at(event.pos)
+        self.captured = None
+        self.dragging = False
+
+        if target is not None:
+            self.deliver(target, event)
+
+    def motion(self, event: pygame.Event):
+        if self.dragging:
+            self.captured.window.position += pygame.Vector2(event.rel)
+
+        target = self.captured or self.desktop.window_at(event.pos)
+        if target is not None:
+            self.deliver(target, event)
@@ -0,0 +1,343 @@
+import math
+import random
+import typing
+import pygame
+import numpy as np
+import affine
+import assets
+import asteroid
+import gradient
+import helpers
+import memory
+import particle
+import program
+import registry
+import simulation_worker
+import spatial_hash
+
+if typing.TYPE_CHECKING:
+    import input_router
+
+class LaserCommand(program.Program):
+
+    # Upper bound on live particles per particle system
+    particle_capacity = 32768
+
+    # How far above the screen the rest of a wave is spread out, so the asteroids arrive over time
+    wave_depth = 600
+
+    def __init__(self, icon: pygame.Surface, wave_size: int = 1):
+        entry = registry.entry("LaserCommand")
+        program.Program.__init__(self, icon, pygame.Vector2(entry.position), entry.name, pygame.Vector2(entry.window_size))
+
+        # The game is drawn onto a surface from the pool that's only held while the window is open
+        self.game_rect = pygame.Rect((0, 0), self.window.content_rect.size)
+        self.game_window: pygame.Surface | None = None
+        self.setup_done = False
+
+        # How many asteroids come down at once
+        self.wave_size = wave_size
+
+        # Where the mouse last was over the window, relative to the game window
+        self.pointer_position = pygame.Vector2(self.game_rect.center)
+
+        # Bumped whenever something that shows up in the game changes. The game window is only re-rendered when
+        # this or the interpolation changes, or it's asked for an area it didn't render last time.
+        self.render_version = 0
+        self.rendered_key = None
+        self.rendered_area = pygame.Rect(0, 0, 0, 0)
+        
+    def setup(self):
+        self.sky_color = helpers.random_hue(80, 80)
+        self.ground_color = helpers.random_hue(80, 50)
+        
+        self.ground_rect = self.game_rect.copy()
+        self.ground_rect.top += self.game_rect.height * 0.9
+        self.ground_rect.height *= 0.10
+
+        self.asteroid_speed = 25
+        # Shared with every other user of the image, each asteroid gets its own copy of the mask to blast apart
+        self.asteroid_image = assets.get_image("imgs/asteroid")
+        self.asteroid_mask = assets.get_mask("imgs/asteroid")
+        self.asteroid_size = self.asteroid_image.get_width() / 2
+
+        self.asteroids = [self.spawn_asteroid(i) for i in range(self.wave_size)]
+
+        # Broadphase so laser shots and ground impacts only check the asteroids near them
+        self.asteroid_grid = spatial_hash.SpatialHash(int(self.asteroid_size * 2))
+        self.asteroid_grid.rebuild(self.asteroids)
+
+        self.exploding = False
+        self.explosion_timer = 0.0
+        self.explosion_length = 5.0
+        self.explosion_position = pygame.Vector2()
+
+        self.alive = True
+        
+        self.setup_done = True
+        
+        # With the simulation worker on, the particles update on it while the game keeps going
+        worker = simulation_worker.shared()
+        self.asteroid_particles = particle.ParticleSystem(LaserCommand.particle_capacity, worker)
+        self.explosion_particles = particle.ParticleSystem(LaserCommand.particle_capacity, worker)
+        self.particle_interval = 0.05
+        
+        self.last_laser_time = 0.0
+        self.laser_interval = 0.5
+        self.laser_draw_time = 0.5
+        self.firing = False
+        self.laser_target = pygame.Vector2()
+        
+        # The laser will blast chunks out of the asteroid with one of the shared circular crater masks
+        self.laser_explosion_radius = 16
+        asteroid.CraterBrushes.preload()
+
+    def spawn_asteroid(self, i: int) -> asteroid.Asteroid:
+        # The first asteroid starts right at the top, the rest of the wave is spread out above it
+        position = pygame.Vector2(random.randint(0, int(self.window.size.x)), 0)
+        goal = pygame.Vector2(random.randint(int(self.window.size.x * 0.25), int(self.window.size.x * 0.75)), self.window.size.y)
+        if i > 0:
+            position.y = -random.uniform(0, LaserCommand.wave_depth)
+
+        return asteroid.Asteroid(self.asteroid_image, position, goal, self.asteroid_speed, self.asteroid_mask.copy())
+        
+
+    # Colors the laser fades through as it's drawn, and the flash that whites out the screen in an explosion
+    laser_gradient = gradient.get((255, 0, 0), (200, 0, 0))
+    explosion_gradient = gradient.get((0, 0, 0), (255, 255, 255))
+
+    # The reticle is a triangle around the cursor with a corner pointing up, built once and moved into place
+    reticle_shape = np.array([affine.apply(affine.rotation(math.radians(30 + offset)), (15, 0)) for offset in (0, 120, -120)])
+
+    @staticmethod
+    def draw_reticle(surface: pygame.Surface, location: pygame.Vector2):
+        pygame.draw.polygon(surface, (220, 30, 30), (LaserCommand.reticle_shape + (location[0], location[1])).tolist(), 3)
+
+    def handle_pointer(self, event: "input_router.PointerEvent"):
+        super().handle_pointer(event)
+
+        # The reticle follows the mouse while it's over the window
+        self.pointer_position = event.local_pos
+        self.render_version += 1
+    
+        # Fire the laser if we are clicking on the window and we haven't fired the laser recently
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.setup_done and self.window.content_rect.collidepoint(event.pos):
+            if self.last_laser_time + self.laser_interval < self.window.open_timer:
+                self.last_laser_time = self.window.open_timer
+                self.firing = True
+                self.laser_target = event.local_pos
+                
+                hit_asteroids = self.check_asteroid_laser_collision()
+                if hit_asteroids:
+                    self.handle_asteroid_laser_collision(hit_asteroids)
+                
+
+    def update(self, delta: float):
+        if not self.setup_done:
+            self.setup()
+
+        program.Program.update(self, delta)
+        if self.open:
+            self.render_version += 1
+
+            # Asteroids only move and create a trail if nothing has impacted yet
+            if self.alive:
+                for cur_asteroid in self.asteroids:
+                    if cur_asteroid.destroyed:
+                        cur_asteroid.hold()
+                        continue
+
+                    cur_asteroid.move(delta)
+
+                    # Add new particles every `particle_intervial` seconds, faster the more the asteroid is damaged.
+                    # Asteroids still waiting above the screen don't leave a trail.
+                    if cur_asteroid.rect.bottom > 0 and cur_asteroid.last_particle_time + (self.particle_interval / cur_asteroid.remaining_fraction) < self.window.open_timer:
+                        cur_asteroid.last_particle_time = self.window.open_timer
+                        self.add_asteroid_particle(cur_asteroid)
+
+                self.asteroid_grid.rebuild(self.asteroids)
+
+                # Check if an asteroid has impacted the ground
+                impact_height = self.game_rect.height - self.asteroid_size * 1.5
+                impact_zone = pygame.Rect(0, impact_height - self.asteroid_size, self.game_rect.width, self.game_rect.height)
+                for cur_asteroid in self.asteroid_grid.query(impact_zone):
+                    if not cur_asteroid.destroyed and cur_asteroid.position.y > impact_height:
+                        self.impact(cur_asteroid)
+                        break
+
+            else:
+                for cur_asteroid in self.asteroids:
+                    cur_asteroid.hold()
+                
+            # Update all particles, this also removes any that are too old
+            self.asteroid_particles.update(delta)
+            self.explosion_particles.update(delta)
+                
+            if self.firing and self.window.open_timer > self.last_laser_time + self.laser_draw_time:
+                self.firing = False
+
+            # Explosion animation
+            if self.exploding:
+                self.explosion_timer += delta
+                self.exploding = self.explosion_timer < self.explosion_length
+
+        # If we have already died once and are now reopening the window, set it back up. Mostly for testing purposes.
+        if not self.alive and self.opening:
+            self.setup()
+
+    def collect_dirty_rects(self) -> list[pygame.Rect]:
+        # The focused game redraws every frame while it is running, even without an update in between since it
+        # draws interpolated positions. In the background it only redraws after it changes. The "lost connection"
+        # screen only redraws occasionally.
+        if self.open and self.setup_done:
+            running = self.alive or self.exploding
+            changed = self.rendered_key is None or self.render_state() != self.rendered_key[0]
+            if (running and (self.window.focused or changed)) or (not running and self.window.fuzzy_pending):
+                self.mark_dirty(self.window.content_rect)
+        return super().collect_dirty_rects()
+
+    def release_surfaces(self):
+        super().release_surfaces()
+        memory.pool.release(self.game_window)
+        self.game_window = None
+
+    def surface_bytes(self) -> dict[str, int]:
+        usage = super().surface_bytes()
+        usage["game_window"] = memory.surface_bytes(self.game_window)
+        if self.setup_done:
+            usage["asteroids"] = sum(memory.surface_bytes(cur_asteroid.rendered) for cur_asteroid in self.asteroids)
+        return usage
+
+    def render_state(self) -> tuple[int, int, int]:
+        """Changes whenever the game looks different, including when particle updates on the worker finish"""
+        return (self.render_version, self.asteroid_particles.generation, self.explosion_particles.generation)
+
+    def state_summary(self) -> dict:
+        summary = super().state_summary()
+        if self.setup_done:
+            summary.update({
+                "alive": self.alive,
+                "exploding": self.exploding,
+                # The tracked mass and a recount of the mask, so a replay also catches them drifting apart
+                "asteroid_mass": [cur_asteroid.mass for cur_asteroid in self.asteroids],
+                "asteroid_mask_count": [cur_asteroid.mask.count() for cur_asteroid in self.asteroids],
+                "asteroid_positions": [[cur_asteroid.position.x, cur_asteroid.position.y] for cur_asteroid in self.asteroids],
+                "particles": [len(self.asteroid_particles), len(self.explosion_particles)],
+                "last_laser_time": self.last_laser_time,
+            })
+        return summary
+
+    def impact(self, impacting_asteroid: asteroid.Asteroid):
+        self.exploding = True
+        self.explode_time = self.window.open_timer
+        self.explosion_position = impacting_asteroid.position.copy()
+        self.alive = False
+        
+        # Add a bunch of particles right at the end
+        for _ in range(50):
+            self.add_asteroid_particle(impacting_asteroid)
+
+        # Make all the particles move away from the impact
+        vec_from_asteroid = self.asteroid_particles.positions - np.array(self.explosion_position, dtype=np.float32)
+        distance = np.linalg.norm(vec_from_asteroid, axis=1, keepdims=True)
+        self.asteroid_particles.set_velocity(vec_from_asteroid / np.maximum(distance, 1e-6) * 100)
+        self.asteroid_particles.set_lifetime(self.explosion_length)
+            
+    def add_asteroid_particle(self, source: asteroid.Asteroid):
+        # Create a new particle moving away from the asteroid and return its slot in the particle pool
+        return self.asteroid_particles.emit(source.position + helpers.random_vector2(8) - pygame.Vector2(0, 8), helpers.random_vector2(5), size_start=5, size_end=25, lifetime=2.0, colorstart=(200, 100, 20))
+    
+    def add_explosion_particle(self):
+        return self.explosion_particles.emit(self.laser_target, helpers.random_vector2(30), 16, 4, 1, (80, 52, 34))
+        
+    def draw_laser(self):
+        # Draw the laser going from the base to the mouse cursor
+        window_rect = self.game_rect
+        laser_base_height = self.ground_rect.height / 2
+        base_position = pygame.Vector2(window_rect.width / 2, window_rect.bottom - laser_base_height)
+        
+        # Laser ratio is the percentage we are through the animation
+        laser_ratio = (self.window.open_timer - self.last_laser_time) / self.laser_draw_time
+        
+        # Laser gets slightly darker and thinner as the animation plays
+        laser_color = gradient.color(LaserCommand.laser_gradient, laser_ratio)
+        laser_width = int(pygame.math.lerp(5, 1, laser_ratio))
+        
+        pygame.draw.line(self.game_window, laser_color, base_position, self.laser_target, laser_width)
+
+    def handle_asteroid_laser_collision(self, hit_asteroids: list[asteroid.Asteroid]):
+        # This also removes the smallest chunk of an asteroid if two parts get separated
+        for hit_asteroid in hit_asteroids:
+            hit_asteroid.blast(self.laser_target, self.laser_explosion_radius)
+        
+        for _ in range(8):
+            self.add_explosion_particle()
+        
+    def check_asteroid_laser_collision(self) -> list[asteroid.Asteroid]:
+        """Return every asteroid the laser's blast overlaps, pixel for pixel"""
+        blast_size = self.laser_explosion_radius * 2 + 1
+        blast_rect = pygame.Rect(0, 0, blast_size, blast_size)
+        blast_rect.center = self.laser_target
+
+        # The grid narrows it down to nearby asteroids before doing the expensive mask check
+        return [candidate for candidate in self.asteroid_grid.query(blast_rect)
+                if candidate.collides(self.laser_target, self.laser_explosion_radius)]
+
+    def draw_game(self, alpha: float):
+        # Draw sky
+        self.game_window.fill(self.sky_color)
+
+        # Draw the ground
+        pygame.draw.rect(self.game_window, self.ground_color, self.ground_rect)
+
+        # Draw asteroid particles
+        self.asteroid_particles.draw(self.game_window, alpha)
+
+        if self.firing:
+            self.draw_laser()
+
+        # Draw asteroids, their images are only re-rendered after they get hit
+        self.game_window.fblits([(cur_asteroid.render(), cur_asteroid.draw_rect(alpha)) for cur_asteroid in self.asteroids])
+
+        # Draw explosion particles
+        self.explosion_particles.draw(self.game_window, alpha)
+
+        if self.exploding:
+            # Draw the growing explosion
+            explode_ratio = self.explosion_timer / self.explosion_length
+            pygame.draw.circle(self.game_window, pygame.colordict.THECOLORS['white'], self.explosion_position, pygame.math.lerp(self.asteroid_size, self.asteroid_size * 5, explode_ratio))
+
+            # The explosion slowly makes the screen more and more white
+            self.game_window.fill(gradient.color(LaserCommand.explosion_gradient, explode_ratio), special_flags=pygame.BLEND_ADD)
+
+        else:
+            # Reticle, don't draw during explosion
+            LaserCommand.draw_reticle(self.game_window, self.pointer_position)
+
+    def draw_window(self, surface: pygame.Surface, alpha: float = 1.0):
+        program.Program.draw_window(self, surface, alpha)
+
+        if self.open:
+            if self.game_window is None:
+                self.game_window = memory.pool.acquire(self.game_rect.size)
+                self.game_window.fill((0, 0, 0))
+                self.rendered_key = None
+                self.rendered_area = pygame.Rect(0, 0, 0, 0)
+
+            if self.alive or self.exploding:
+                # Only the part of the game the desktop can show needs drawing, and only if it changed since then
+                clip = surface.get_clip().move(-self.window.content_rect.left, -self.window.content_rect.top).clip(self.game_rect)
+                render_key = (self.render_state(), alpha)
+                if render_key != self.rendered_key or not self.rendered_area.contains(clip):
+                    self.rendered_key = render_key
+                    self.rendered_area = clip
+                    self.game_window.set_clip(clip)
+                    self.draw_game(alpha)
+                    self.game_window.set_clip(None)
+
+            else:
+                # Draw a "lost connection" screen
+                self.window.draw_fuzzy_screen(self.game_window)
+
+            # Draw the final window onto the screen
+            surface.blit(self.game_window, self.window.content_rect)
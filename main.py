@@ -1,35 +1,88 @@
+import time
+# Taken before the rest of the imports so the startup report can time them
+imports_started = time.perf_counter()
+
+import argparse
+import random
 import pygame
-import desktop
-import program
+import assets
+import game
+import input_router
+import profiler
+import simulation_worker
+
+imports_done = time.perf_counter()
+
+def run(profile: bool = False, trace_file: str | None = None, render_fps: int = 30, record_file: str | None = None, seed: int | None = None, startup_report: bool = False, threaded_simulation: bool = False, memory_cap: int | None = None,
+        chat_server: tuple[str, int] | None = None, capture_dir: str | None = None, capture_format: str = "raw", wave_size: int = 1):
+    """Run the game. A `render_fps` of 0 renders as fast as possible.
 
-SCREEN_SIZE = WIDTH, HEIGHT = (640, 480)
+    With a `record_file` the input and frame times are recorded to it, so the session can be replayed with `replay`.
+    With `startup_report` how long each part of starting up took is printed once the first frame is on screen.
+    With `threaded_simulation` particles are simulated on a background thread, overlapping with the rest of the frame.
+    A `memory_cap` in bytes empties the shared surface caches whenever the desktop's surfaces add up to more.
+    With a `chat_server` (host, port) the chat connects to it for live messages once it's opened.
+    With a `capture_dir` every frame shown is saved there in `capture_format`, see `capture`.
+    `wave_size` is how many asteroids Laser Command sends down at once.
+    """
+    startup = profiler.StartupTimer(imports_started)
+    startup.mark("interpreter", imports_started)
+    startup.mark("imports", imports_done)
 
-def run():
     pygame.init()
     pygame.font.init()
+    startup.mark("pygame init")
+
+    # Decode the images in the background while the display and fonts get set up
+    assets.preload()
     
-    screen = pygame.display.set_mode(SCREEN_SIZE, pygame.SCALED)
+    screen = pygame.display.set_mode(game.SCREEN_SIZE, pygame.SCALED)
     pygame.display.set_caption("Interstellar Tech Support")
+    startup.mark("display")
     
     done = False
     clock = pygame.time.Clock()
-    
-    its_desktop = desktop.Desktop(pygame.Rect(0, 0, *SCREEN_SIZE))
 
-    chat_support_icon = pygame.image.load("res/imgs/ChatIcon.png").convert_alpha()
-    chat_program = program.ChatSupport(chat_support_icon)
+    if threaded_simulation:
+        simulation_worker.enable()
+    if chat_server is not None:
+        import chat_support
+        chat_support.configure(*chat_server)
+
+    if seed is None:
+        seed = random.getrandbits(64)
+    its_desktop, simulation_clock = game.new_game(seed, deterministic=record_file is not None, wave_size=wave_size)
+    its_desktop.memory_cap = memory_cap
+    startup.mark("desktop")
 
-    laser_program_icon = pygame.image.load("res/imgs/LaserIcon.png").convert_alpha()
-    laser_program = program.LaserCommand(laser_program_icon)
+    recorder = None
+    if record_file is not None:
+        import replay
+        recorder = replay.Recorder(record_file, seed, wave_size)
 
-    its_desktop.programs.append(chat_program)
-    its_desktop.programs.append(laser_program)
+    # Profiling times every frame and logs frames over budget. F3 toggles the overlay.
+    frame_profiler = None
+    overlay_rect = None
+    if profile or trace_file is not None:
+        frame_profiler = profiler.Profiler()
+        its_desktop.profiler = frame_profiler
+
+    frame_capture = None
+    if capture_dir is not None:
+        import capture
+        frame_capture = capture.FrameCapture(capture_dir, screen, capture_format)
     
     while not done:
-        # 30 FPS to give a more old school feel
-        delta = clock.tick(30) / 1000.0
+        # The first frame goes straight to the screen instead of waiting out the rest of a frame since the clock
+        # was created
+        frame_time = clock.tick(render_fps if startup is None else 0) / 1000.0
+
+        if frame_profiler is not None:
+            frame_profiler.begin_frame()
 
-        for event in pygame.event.get():
+        # The desktop routes the mouse events to the programs, anything else is left for us
+        events = pygame.event.get()
+        for event in game.simulate_frame(its_desktop, simulation_clock, frame_time, events):
             if event.type == pygame.QUIT:
                 done = True
                 
@@ -37,31 +90,91 @@ def run():
                 if event.key == pygame.K_ESCAPE:
                     done = True
 
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if event.button == 1:
-                    # Handle ordering of windows
-                    its_desktop.detect_window_click(event.pos)
-                    
-                    # Check if we are clicking on an icon for any of the programs.
-                    # NOTE: We can currently open a program if the icon is behind the window
-                    for cur_program in its_desktop.programs:
-                        if not cur_program.open and not cur_program.opening and cur_program.icon_rect.collidepoint(event.pos):
-                            if cur_program.selected:
-                                cur_program.launch_program()
-                                cur_program.selected = False
-                            else:
-                                cur_program.selected = True
-                        else:
-                            cur_program.selected = False
-                    
-        its_desktop.update(delta)
-
-        screen.fill((0, 0, 0))
-        its_desktop.draw(screen, pygame.Rect(0, 0, *SCREEN_SIZE))
+                if event.key == pygame.K_F3 and frame_profiler is not None:
+                    frame_profiler.show_overlay = not frame_profiler.show_overlay
+
+        # Pick up any clicks that came in while updating, so they show up this frame instead of the next
+        late_events = pygame.event.get(input_router.InputRouter.pointer_events)
+        its_desktop.handle_input(late_events)
+
+        if recorder is not None:
+            recorder.record_frame(frame_time, events, late_events)
+
+        # The desktop covers the whole screen, so there's no need to clear it first
+        updated_rects = its_desktop.draw(screen, pygame.Rect(0, 0, *game.SCREEN_SIZE), simulation_clock.alpha)
+
+        if frame_profiler is not None:
+            # The overlay is drawn straight onto the screen, so the desktop has to repaint whatever it covered
+            if overlay_rect is not None:
+                its_desktop.mark_dirty(overlay_rect)
+                updated_rects.append(overlay_rect)
+            overlay_rect = frame_profiler.draw_overlay(screen)
+            if overlay_rect is not None:
+                updated_rects.append(overlay_rect)
         
-        pygame.display.flip()
+        pygame.display.update(updated_rects)
+
+        if frame_capture is not None:
+            frame_capture.capture(screen, updated_rects, frame_time)
+
+        if startup is not None:
+            startup.mark("first frame")
+            if startup_report:
+                print(startup.report())
+            startup = None
+
+        if frame_profiler is not None:
+            frame_profiler.end_frame()
         
+    if recorder is not None:
+        recorder.close(replay.game_state(its_desktop))
+
+    if chat_server is not None and chat_support.transport is not None:
+        chat_support.transport.close()
+
+    if frame_capture is not None:
+        stats = frame_capture.close()
+        print(f"captured {stats['frames']} frames to {capture_dir}: {stats['stored']} stored, {stats['repeated']} unchanged, "
+              f"{stats['dropped']} dropped, {stats['mean_copy_ms']:.2f} ms to copy and {stats['mean_write_ms']:.2f} ms to write each")
+
+    if trace_file is not None:
+        frame_profiler.export_chrome_trace(trace_file)
+
     pygame.quit()
     
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Interstellar Tech Support")
+    parser.add_argument("--profile", action="store_true", help="time every frame and log the ones that go over budget, F3 shows the timings")
+    parser.add_argument("--trace", metavar="FILE", help="profile and write a Chrome trace of the last frames to FILE on exit")
+    parser.add_argument("--fps", type=int, default=30, help="frames to render per second, 0 for uncapped (default: %(default)s)")
+    parser.add_argument("--record", metavar="FILE", help="record the session to FILE, play it back with replay.py")
+    parser.add_argument("--seed", type=int, help="seed for the random numbers, random by default")
+    parser.add_argument("--startup-report", action="store_true", help="print how long starting up took, up to the first frame on screen")
+    parser.add_argument("--threaded-simulation", action="store_true", help="simulate particles on a background thread")
+    parser.add_argument("--memory-cap", type=float, metavar="MB", help="empty the shared surface caches when surfaces take up more than this")
+    parser.add_argument("--chat-server", metavar="HOST:PORT", help="take live chat messages from this server, see mock_chat_server.py")
+    parser.add_argument("--wave-size", type=int, default=1, metavar="N", help="how many asteroids Laser Command sends down at once (default: %(default)s)")
+    parser.add_argument("--capture", metavar="DIR", help="save every frame shown to DIR, see capture.py")
+    parser.add_argument("--capture-format", default="raw", help="raw frames in one file, or a PNG per frame, which is much slower (default: %(default)s)")
+    args = parser.parse_args()
+
+    chat_server = None
+    if args.chat_server is not None:
+        host, _, port = args.chat_server.rpartition(":")
+        if not host or not port.isdigit():
+            parser.error("--chat-server must look like HOST:PORT")
+        chat_server = (host, int(port))
+
+    if args.capture is not None:
+        import capture
+        if args.capture_format not in capture.FORMATS:
+            parser.error(f"--capture-format must be one of {', '.join(capture.FORMATS)}")
+
+    if args.wave_size < 1:
+        parser.error("--wave-size must be at least 1")
+
+    memory_cap = None if args.memory_cap is None else int(args.memory_cap * 1024 * 1024)
+    run(profile=args.profile, trace_file=args.trace, render_fps=args.fps, record_file=args.record, seed=args.seed,
+        startup_report=args.startup_report, threaded_simulation=args.threaded_simulation, memory_cap=memory_cap,
+        chat_server=chat_server, capture_dir=args.capture, capture_format=args.capture_format,
+        wave_size=args.wave_size)
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""Surface memory: a pool of reusable surfaces, and the shared caches that can be emptied to stay under a cap.
+
+Programs give their surfaces back to the `pool` when they're done with them instead of dropping them, so the next
+surface of the same size comes out of the pool rather than being allocated. Modules with caches of surfaces
+register them with `register_cache`, so the desktop can report how much memory they hold and empty them when it
+goes over its memory cap, biggest first.
+"""
+
+from collections.abc import Callable
+import pygame
+
+def surface_bytes(surface: pygame.Surface | None) -> int:
+    if surface is None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
+
+class SurfacePool:
+    """Unused surfaces kept by size and whether they have per-pixel alpha, up to `max_bytes` of them"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.free: dict[tuple[int, int, bool], list[pygame.Surface]] = {}
+
+        # How many surfaces were handed out, and how many of those had to be allocated
+        self.acquired = 0
+        self.allocated = 0
+
+    def acquire(self, size: tuple[int, int], alpha: bool = False) -> pygame.Surface:
+        """A surface of `size` with undefined contents, no colorkey and no clip"""
+        self.acquired += 1
+        key = (int(size[0]), int(size[1]), alpha)
+        free = self.free.get(key)
+        if free:
+            surface = free.pop()
+            self.bytes -= surface_bytes(surface)
+            return surface
+
+        self.allocated += 1
+        surface = pygame.Surface(key[:2], pygame.SRCALPHA if alpha else 0)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha() if alpha else surface.convert()
+        return surface
+
+    def release(self, surface: pygame.Surface | None):
+        """Hand a surface back. Nothing else may keep drawing on it or showing it."""
+        if surface is None:
+            return
+
+        size = surface_bytes(surface)
+        if self.bytes + size > self.max_bytes:
+            return
+
+        surface.set_colorkey(None)
+        surface.set_alpha(None)
+        surface.set_clip(None)
+        self.free.setdefault((surface.get_width(), surface.get_height(), bool(surface.get_flags() & pygame.SRCALPHA)), []).append(surface)
+        self.bytes += size
+
+    def clear(self):
+        self.free.clear()
+        self.bytes = 0
+
+pool = SurfacePool()
+
+class Cache:
+    """A shared cache as far as memory accounting is concerned: how big it is and how to empty it"""
+
+    __slots__ = ("name", "size", "evict")
+
+    def __init__(self, name: str, size: Callable[[], int], evict: Callable[[], None]):
+        self.name = name
+        self.size = size
+        self.evict = evict
+
+caches: list[Cache] = []
+
+def register_cache(name: str, size: Callable[[], int], evict: Callable[[], None]):
+    caches.append(Cache(name, size, evict))
+
+register_cache("surface pool", lambda: pool.bytes, pool.clear)
+
+def cache_usage() -> dict[str, int]:
+    return {cache.name: cache.size() for cache in caches}
+
+def evict_caches(over: int) -> int:
+    """Empty the biggest caches until `over` bytes have been freed or there's nothing left to free, returning how
+    much was freed"""
+    freed = 0
+    for cache in sorted(caches, key=lambda cache: cache.size(), reverse=True):
+        if freed >= over:
+            break
+        size = cache.size()
+        if size == 0:
+            break
+        cache.evict()
+        freed += size - cache.size()
+    return freed
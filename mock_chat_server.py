@@ -0,0 +1,141 @@
+"""A local stand-in for the chat server, to try the live chat and load test it without the real thing.
+
+Every client that connects gets its own stream of caller messages, either made up at random or replayed from a
+script, and every answer it sends back is counted. Messages are sent at `rate` per second in small batches, and
+sending waits whenever the client stops reading, so a client that can't keep up slows the stream down.
+
+    python mock_chat_server.py                          # a few random callers, 5 messages a second
+    python mock_chat_server.py --rate 5000              # a flood of them
+    python mock_chat_server.py --script calls.jsonl     # replay a script, see `script_messages`
+    python main.py --chat-server 127.0.0.1:8765         # and connect the game to it
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections.abc import Iterator
+
+logger = logging.getLogger(__name__)
+
+COMPLAINTS = [
+    "my screen went dark",
+    "the laser won't fire",
+    "I think an asteroid hit the relay",
+    "is anyone there?",
+    "the static is back",
+    "I can't find the close button",
+    "everything is upside down",
+    "it says lost connection again",
+    "how do I reboot the base?",
+    "thanks, that fixed it",
+]
+
+class MockChatServer:
+
+    # How often a batch of messages goes out
+    tick = 0.01
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, rate: float = 5.0, callers: int = 8,
+                 script: str | None = None, seed: int | None = None):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.callers = callers
+        self.script = script
+        self.seed = seed
+
+        self.sent = 0
+        self.answers = 0
+        self.clients = 0
+
+        self.server: asyncio.Server | None = None
+        self.ready = threading.Event()
+
+    def random_messages(self, rng: random.Random) -> Iterator[dict]:
+        while True:
+            yield {"ticket": rng.randrange(self.callers), "text": rng.choice(COMPLAINTS)}
+
+    def script_messages(self) -> Iterator[dict]:
+        """The messages in the script, one JSON object per line like `{"ticket": 3, "text": "hello"}`, over and over"""
+        with open(self.script) as f:
+            messages = [json.loads(line) for line in f if line.strip()]
+        if not messages:
+            return
+        while True:
+            yield from messages
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients += 1
+        logger.info("client connected, %d so far", self.clients)
+
+        messages = self.script_messages() if self.script is not None else self.random_messages(random.Random(self.seed))
+        talk = asyncio.create_task(self.talk(writer, messages))
+        try:
+            while line := await reader.readline():
+                self.answers += 1
+                logger.debug("answer: %s", line.decode("utf-8", "replace").strip())
+        except ConnectionError:
+            pass
+        finally:
+            talk.cancel()
+            writer.close()
+
+    async def talk(self, writer: asyncio.StreamWriter, messages: Iterator[dict]):
+        # Send whatever's due every tick, so high rates go out in batches instead of a write per message
+        start = time.perf_counter()
+        sent = 0
+        try:
+            while True:
+                due = int((time.perf_counter() - start) * self.rate) - sent
+                if due > 0:
+                    batch = [json.dumps(message).encode("utf-8") + b"\n" for _, message in zip(range(due), messages)]
+                    if not batch:
+                        return
+                    writer.write(b"".join(batch))
+                    await writer.drain()
+                    sent += len(batch)
+                    self.sent += len(batch)
+                await asyncio.sleep(MockChatServer.tick)
+        except ConnectionError:
+            pass
+
+    async def serve(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        # With a port of 0 the OS picks one
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start_in_thread(self) -> int:
+        """Serve from a background thread and return the port once it's listening"""
+        thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name="mock-chat-server", daemon=True)
+        thread.start()
+        self.ready.wait()
+        return self.port
+
+def run(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Stand-in chat server that plays caller traffic to whoever connects")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=5.0, help="messages per second to each client (default: %(default)s)")
+    parser.add_argument("--callers", type=int, default=8, help="how many tickets the random messages come from (default: %(default)s)")
+    parser.add_argument("--script", metavar="FILE", help="replay the messages in FILE, one JSON object per line, instead of random ones")
+    parser.add_argument("--seed", type=int, help="seed for the random messages")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = MockChatServer(args.host, args.port, args.rate, args.callers, args.script, args.seed)
+    logger.info("serving on %s:%d", args.host, args.port)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        logger.info("sent %d messages, got %d answers", server.sent, server.answers)
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
@@ -0,0 +1,79 @@
+"""Static noise for the "lost connection" screens, generated as whole arrays instead of tile by tile"""
+
+import random
+import numpy as np
+import pygame
+import memory
+
+class StaticNoise:
+    """Gray static made of square tiles.
+
+    With a `frame_count` the frames are generated once, shared by every `StaticNoise` with the same settings, and
+    cycled through. Without one, a fresh frame is generated every time.
+    """
+
+    # Shared frame banks keyed by (size, tile size, levels, frame count)
+    banks: dict[tuple, list[pygame.Surface]] = {}
+
+    def __init__(self, tile_size: int = 16, levels: int = 256, frame_count: int = 8):
+        self.tile_size = tile_size
+        # How many shades of gray the tiles can be, 2 gives black and white static
+        self.levels = levels
+        self.frame_count = frame_count
+
+        # Seed from `random` so seeding it makes the static reproducible too
+        self.rng = np.random.default_rng(random.getrandbits(64))
+
+        # Start somewhere random so windows showing the same bank don't flicker in sync
+        self.frame_index = random.randrange(max(frame_count, 1))
+
+        # Scratch surfaces for generating frames: one pixel per tile, and the scaled up tiles
+        self.tile_image: pygame.Surface | None = None
+        self.frame_image: pygame.Surface | None = None
+
+    def generate(self, size: tuple[int, int]) -> pygame.Surface:
+        """Generate a frame covering `size`, made of whole tiles so the last row and column may hang off the edge.
+
+        The returned surface is reused by the next call.
+        """
+        tiles_x = size[0] // self.tile_size + 1
+        tiles_y = size[1] // self.tile_size + 1
+        if self.tile_image is None or self.tile_image.get_size() != (tiles_x, tiles_y):
+            self.tile_image = pygame.Surface((tiles_x, tiles_y), depth=32)
+            self.frame_image = pygame.Surface((tiles_x * self.tile_size, tiles_y * self.tile_size), depth=32)
+
+        gray = self.rng.integers(0, self.levels, (tiles_x, tiles_y), dtype=np.uint32)
+        if self.levels > 1:
+            gray = gray * 255 // (self.levels - 1)
+
+        # Every channel gets the same value, so the channel order of the surface doesn't matter. Then scale the tile
+        # image up without smoothing to get the tiles.
+        pygame.surfarray.blit_array(self.tile_image, gray * 0x010101)
+        pygame.transform.scale(self.tile_image, self.frame_image.get_size(), self.frame_image)
+        return self.frame_image
+
+    def frames(self, size: tuple[int, int]) -> list[pygame.Surface]:
+        key = (tuple(size), self.tile_size, self.levels, self.frame_count)
+        bank = StaticNoise.banks.get(key)
+        if bank is None:
+            bank = StaticNoise.banks[key] = [self.generate(size).copy() for _ in range(self.frame_count)]
+        return bank
+
+    def draw(self, surface: pygame.Surface):
+        if self.frame_count <= 0:
+            surface.blit(self.generate(surface.get_size()), (0, 0))
+            return
+
+        bank = self.frames(surface.get_size())
+        self.frame_index = (self.frame_index + 1) % len(bank)
+        surface.blit(bank[self.frame_index], (0, 0))
+
+    @staticmethod
+    def bank_bytes() -> int:
+        return sum(memory.surface_bytes(frame) for bank in StaticNoise.banks.values() for frame in bank)
+
+    def surface_bytes(self) -> int:
+        """Memory of the scratch surfaces this noise generates frames with, not counting the shared banks"""
+        return memory.surface_bytes(self.tile_image) + memory.surface_bytes(self.frame_image)
+
+memory.register_cache("static noise", StaticNoise.bank_bytes, StaticNoise.banks.clear)
@@ -1,33 +1,284 @@
 import pygame
-import helpers
+import numpy as np
+import gradient
+import memory
+import simulation_worker
 
-class Particle:
-    """Basic circular particle that starts in a location, moves with a given velocity, and changes size and color over its lifetime"""
-    
-    def __init__(self, position: pygame.Vector2, velocity: pygame.Vector2, size_start: float, size_end: float, lifetime=1.0, colorstart=(255, 255, 255), colorend=(0, 0, 0)):
+class CircleSpriteCache:
+    """Pre-rasterized circle sprites keyed by integer radius and quantized color.
+
+    Particles are drawn by blitting these sprites instead of calling `pygame.draw.circle` per particle. A sprite for
+    radius `r` is `2r` pixels wide, which is exactly what `pygame.draw.circle` covers for a truncated center and radius.
+    """
+
+    def __init__(self, color_step: int = 8, max_sprites: int = 4096):
+        self.color_step = color_step
+        self.max_sprites = max_sprites
+        self.sprites: dict[int, pygame.Surface] = {}
+        self.bytes = 0
+
+    def keys(self, radius: np.ndarray, color: np.ndarray) -> np.ndarray:
+        """Pack the radius and quantized color of each particle into one integer key"""
+        quantized = np.minimum(np.rint(color / self.color_step) * self.color_step, 255).astype(np.int64)
+        return (radius.astype(np.int64) << 24) | (quantized[:, 0] << 16) | (quantized[:, 1] << 8) | quantized[:, 2]
+
+    def get(self, key: int) -> pygame.Surface:
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            if len(self.sprites) >= self.max_sprites:
+                self.clear()
+            sprite = self.sprites[key] = CircleSpriteCache.rasterize(key >> 24, ((key >> 16) & 255, (key >> 8) & 255, key & 255))
+            self.bytes += memory.surface_bytes(sprite)
+        return sprite
+
+    def clear(self):
+        self.sprites.clear()
+        self.bytes = 0
+
+    @staticmethod
+    def rasterize(radius: int, color: tuple[int, int, int]) -> pygame.Surface:
+        # Use a colorkey rather than per-pixel alpha since colorkeyed blits are much cheaper
+        colorkey = (0, 0, 0) if color != (0, 0, 0) else (255, 255, 255)
+        sprite = pygame.Surface((radius * 2, radius * 2))
+        sprite.fill(colorkey)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        sprite.set_colorkey(colorkey, pygame.RLEACCEL)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert()
+        return sprite
+
+class ParticleSnapshot:
+    """What drawing needs from a particle system: the first `count` entries of its positions, sizes and colors"""
+
+    __slots__ = ("count", "position", "previous_position", "size", "color")
+
+    def __init__(self, count: int, position: np.ndarray, previous_position: np.ndarray, size: np.ndarray, color: np.ndarray):
+        self.count = count
         self.position = position
-        self.velocity = velocity
-        self.size = size_start
-        self.size_start = size_start
-        self.size_end = size_end
-        self.lifetime = lifetime
-        self.t = 0
-        
-        self.colorstart = colorstart
-        self.colorend = colorend
-        self.color = self.colorstart
-        
+        self.previous_position = previous_position
+        self.size = size
+        self.color = color
+
+    @staticmethod
+    def allocate(capacity: int) -> "ParticleSnapshot":
+        return ParticleSnapshot(0, np.zeros((capacity, 2), dtype=np.float32), np.zeros((capacity, 2), dtype=np.float32),
+                                np.zeros(capacity, dtype=np.float32), np.zeros((capacity, 3), dtype=np.uint8))
+
+class ParticleSystem:
+    """Fixed-capacity pool of circular particles stored as parallel NumPy arrays.
+
+    Each particle starts in a location, moves with a given velocity, and changes size and color over its lifetime.
+    Particles are updated as a batch, and dead particles are compacted away by swapping live particles from the
+    end of the pool into their slots, so the live particles always occupy the first `count` entries.
+
+    With a `worker` updates run on the worker's thread instead. Anything that reads or changes the particles waits
+    for the update to finish first, except drawing: every finished update publishes a snapshot into one of two
+    buffers and swaps them, and drawing reads the last published one without waiting or copying. Drawing can then
+    be a step behind, but the simulation plays out exactly the same.
+    """
+
+    # Sprites are shared between every particle system
+    sprite_cache = CircleSpriteCache()
+
+    def __init__(self, capacity: int = 4096, worker: simulation_worker.SimulationWorker | None = None):
+        self.capacity = capacity
+        self.count = 0
+
+        self.position = np.zeros((capacity, 2), dtype=np.float32)
+        # Position as of the previous update, so drawing can interpolate between the two
+        self.previous_position = np.zeros((capacity, 2), dtype=np.float32)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float32)
+        self.age = np.zeros(capacity, dtype=np.float32)
+        self.lifetime = np.ones(capacity, dtype=np.float32)
+        self.size_start = np.zeros(capacity, dtype=np.float32)
+        self.size_end = np.zeros(capacity, dtype=np.float32)
+        # Colors come from a gradient in the shared palette rather than being interpolated per particle
+        self.gradient_id = np.zeros(capacity, dtype=np.uint16)
+
+        # Derived every update from the age / lifetime ratio
+        self.size = np.zeros(capacity, dtype=np.float32)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+
+        # Every per-particle array, so compaction can move a particle in one place
+        self._arrays = (self.position, self.previous_position, self.velocity, self.age, self.lifetime, self.size_start, self.size_end,
+                        self.gradient_id, self.size, self.color)
+
+        self.worker = worker
+        self.pending_update: simulation_worker.Job | None = None
+        if worker is not None:
+            self.front = ParticleSnapshot.allocate(capacity)
+            self.back = ParticleSnapshot.allocate(capacity)
+
+        # Counts the updates that have finished, so whoever draws the particles can tell when they've changed
+        self.generation = 0
+
+    def __len__(self) -> int:
+        self.wait()
+        return self.count
+
+    def wait(self):
+        """Wait for an update running on the worker to finish"""
+        if self.pending_update is not None:
+            job, self.pending_update = self.pending_update, None
+            job.wait()
+
+    def emit(self, position: pygame.Vector2, velocity: pygame.Vector2, size_start: float, size_end: float, lifetime=1.0, colorstart=(255, 255, 255), colorend=(0, 0, 0)) -> int:
+        """Add a single particle and return its slot, or -1 if the pool is full"""
+        self.wait()
+        if self.count >= self.capacity:
+            return -1
+
+        i = self.count
+        self.position[i] = position
+        self.previous_position[i] = position
+        self.velocity[i] = velocity
+        self.age[i] = 0
+        self.lifetime[i] = lifetime
+        self.size_start[i] = size_start
+        self.size_end[i] = size_end
+        self.gradient_id[i] = gradient.get(colorstart, colorend)
+        self.size[i] = size_start
+        self.color[i] = colorstart[:3]
+        self.count += 1
+        return i
+
+    def emit_many(self, positions, velocities, size_start, size_end, lifetime=1.0, colorstart=(255, 255, 255), colorend=(0, 0, 0)) -> int:
+        """Add a batch of particles sharing everything except position and velocity.
+
+        Returns the number of particles actually added, which is less than requested if the pool fills up.
+        """
+        self.wait()
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+        velocities = np.asarray(velocities, dtype=np.float32).reshape(-1, 2)
+        n = min(len(positions), self.capacity - self.count)
+        if n <= 0:
+            return 0
+
+        s = slice(self.count, self.count + n)
+        self.position[s] = positions[:n]
+        self.previous_position[s] = positions[:n]
+        self.velocity[s] = velocities[:n]
+        self.age[s] = 0
+        self.lifetime[s] = lifetime
+        self.size_start[s] = size_start
+        self.size_end[s] = size_end
+        self.gradient_id[s] = gradient.get(colorstart, colorend)
+        self.size[s] = size_start
+        self.color[s] = colorstart[:3]
+        self.count += n
+        return n
+
     def update(self, delta: float):
-        self.t += delta
-        self.position += self.velocity * delta
-        
-        lifetime_ratio = self.t / self.lifetime
-        self.color = helpers.lerp_rgb(self.colorstart, self.colorend, lifetime_ratio)
-        self.size = pygame.math.lerp(self.size_start, self.size_end, lifetime_ratio)
-        
-    def draw(self, surface):
-        pygame.draw.circle(surface, self.color, self.position, self.size)
-        
+        self.wait()
+        if self.worker is None:
+            self.simulate(delta)
+        else:
+            self.pending_update = self.worker.submit(self.simulate, delta)
+
+    def simulate(self, delta: float):
+        n = self.count
+        if n == 0:
+            self.publish()
+            return
+
+        self.age[:n] += delta
+        self.previous_position[:n] = self.position[:n]
+        self.position[:n] += self.velocity[:n] * delta
+
+        lifetime_ratio = self.age[:n] / self.lifetime[:n]
+        self.size[:n] = self.size_start[:n] + (self.size_end[:n] - self.size_start[:n]) * lifetime_ratio
+
+        # Colors are clamped by the palette lookup, sizes are not
+        gradient.palette.lookup(self.gradient_id[:n], lifetime_ratio, out=self.color[:n])
+
+        self.compact()
+        self.publish()
+
+    def publish(self):
+        """Make the finished update visible to drawing"""
+        if self.worker is not None:
+            n = self.count
+            back = self.back
+            back.position[:n] = self.position[:n]
+            back.previous_position[:n] = self.previous_position[:n]
+            back.size[:n] = self.size[:n]
+            back.color[:n] = self.color[:n]
+            back.count = n
+            self.front, self.back = back, self.front
+        self.generation += 1
+
+    def compact(self):
+        """Swap-remove every particle that has outlived its lifetime"""
+        n = self.count
+        dead = np.flatnonzero(self.age[:n] >= self.lifetime[:n])
+        if len(dead) == 0:
+            return
+
+        new_count = n - len(dead)
+
+        # Dead slots below the new count are holes that need filling, and the live particles above it fill them.
+        # There are always exactly as many of one as the other.
+        holes = dead[dead < new_count]
+        if len(holes) > 0:
+            tail_alive = np.ones(n - new_count, dtype=bool)
+            tail_alive[dead[dead >= new_count] - new_count] = False
+            movers = np.flatnonzero(tail_alive) + new_count
+            for array in self._arrays:
+                array[holes] = array[movers]
+
+        self.count = new_count
+
+    def clear(self):
+        self.wait()
+        self.count = 0
+
+    def set_velocity(self, velocity):
+        """Overwrite the velocity of every live particle, either with one vector or one per particle"""
+        self.wait()
+        self.velocity[:self.count] = velocity
+
+    def set_lifetime(self, lifetime):
+        self.wait()
+        self.lifetime[:self.count] = lifetime
+
     @property
-    def isalive(self):
-        return self.t < self.lifetime
\ No newline at end of file
+    def positions(self) -> np.ndarray:
+        self.wait()
+        return self.position[:self.count]
+
+    def snapshot(self) -> ParticleSnapshot:
+        """The particles as of the last finished update, for drawing"""
+        if self.worker is not None:
+            return self.front
+        return ParticleSnapshot(self.count, self.position, self.previous_position, self.size, self.color)
+
+    def draw(self, surface: pygame.Surface, alpha: float = 1.0):
+        """Draw every live particle with a single batched blit.
+
+        `alpha` is how far to draw the particles between their previous and current positions.
+        """
+        particles = self.snapshot()
+        n = particles.count
+        radius = particles.size[:n].astype(np.int32)
+
+        # `pygame.draw.circle` draws nothing below a radius of 1, so neither do we
+        visible = np.flatnonzero(radius >= 1)
+        if len(visible) == 0:
+            return
+        radius = radius[visible]
+
+        # Look up one sprite per distinct key rather than one per particle
+        keys = ParticleSystem.sprite_cache.keys(radius, particles.color[visible])
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        unique_sprites = [ParticleSystem.sprite_cache.get(key) for key in unique_keys.tolist()]
+        sprites = [unique_sprites[i] for i in inverse.ravel().tolist()]
+
+        position = particles.position[visible]
+        if alpha < 1.0:
+            previous = particles.previous_position[visible]
+            position = previous + (position - previous) * alpha
+
+        topleft = position.astype(np.int32) - radius[:, None]
+        surface.fblits(zip(sprites, map(tuple, topleft.tolist())))
+
+memory.register_cache("particle sprites", lambda: ParticleSystem.sprite_cache.bytes, ParticleSystem.sprite_cache.clear)
@@ -0,0 +1,217 @@
+"""Lightweight frame profiler for the desktop and its programs.
+
+Timed sections are written into a fixed-size ring buffer, so profiling can stay on for a whole session without
+growing. The most recent sections can be exported as Chrome trace-event JSON (open it in chrome://tracing or
+https://ui.perfetto.dev), summarized in an on-screen overlay, and a watchdog logs which section was responsible
+whenever a frame goes over budget.
+"""
+
+import json
+import logging
+import os
+import time
+import pygame
+import fonts
+
+logger = logging.getLogger(__name__)
+
+class Section:
+    """Context manager that times one section. Reused, so entering a section doesn't allocate."""
+
+    __slots__ = ("profiler", "name_id")
+
+    def __init__(self, profiler: "Profiler", name_id: int):
+        self.profiler = profiler
+        self.name_id = name_id
+
+    def __enter__(self):
+        self.profiler.begin(self.name_id)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.end()
+
+class NullSection:
+    """Stands in for a section when profiling is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+NULL_SECTION = NullSection()
+
+class Profiler:
+
+    overlay_font_size = 18
+    overlay_lines = 8
+
+    def __init__(self, capacity: int = 65536, frame_budget: float = 1 / 30):
+        self.capacity = capacity
+        self.frame_budget = frame_budget
+
+        self.names: list[str] = []
+        self.sections: dict[str, Section] = {}
+
+        # NumPy is only imported once profiling is turned on, it adds a lot to the time it takes to start up
+        import numpy as np
+
+        # Ring buffer of finished sections. `written` keeps counting past the capacity, so the next slot is
+        # `written % capacity` and the buffer is full once `written >= capacity`.
+        self.name_ids = np.zeros(capacity, dtype=np.int32)
+        self.starts = np.zeros(capacity, dtype=np.float64)
+        self.durations = np.zeros(capacity, dtype=np.float64)
+        self.depths = np.zeros(capacity, dtype=np.int16)
+        self.frames = np.zeros(capacity, dtype=np.int32)
+        self.written = 0
+
+        # Sections that are currently open, as [name id, start time, time spent in child sections]
+        self.stack: list[list] = []
+
+        self.origin = time.perf_counter()
+        self.frame_number = 0
+        self.frame_start = self.origin
+        self.last_frame_time = 0.0
+
+        # Time spent in each section this frame, not counting child sections, so the watchdog can blame the
+        # section that actually did the work rather than whatever called it
+        self.frame_self_times: dict[int, float] = {}
+
+        # Smoothed per-section time per frame for the overlay
+        self.averages: dict[int, float] = {}
+        self.average_frame_time = 0.0
+        self.smoothing = 0.1
+
+        self.show_overlay = False
+        self.font: pygame.font.Font | None = None
+
+    def section(self, name: str) -> Section:
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(self, len(self.names))
+            self.names.append(name)
+        return section
+
+    def begin(self, name_id: int):
+        self.stack.append([name_id, time.perf_counter(), 0.0])
+
+    def end(self):
+        end_time = time.perf_counter()
+        name_id, start_time, child_time = self.stack.pop()
+        duration = end_time - start_time
+
+        if self.stack:
+            self.stack[-1][2] += duration
+        self.frame_self_times[name_id] = self.frame_self_times.get(name_id, 0.0) + duration - child_time
+
+        i = self.written % self.capacity
+        self.name_ids[i] = name_id
+        self.starts[i] = start_time - self.origin
+        self.durations[i] = duration
+        self.depths[i] = len(self.stack)
+        self.frames[i] = self.frame_number
+        self.written += 1
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.frame_self_times.clear()
+
+    def end_frame(self):
+        """Finish the frame, update the overlay statistics and check the frame against the budget"""
+        self.last_frame_time = time.perf_counter() - self.frame_start
+
+        self.average_frame_time += (self.last_frame_time - self.average_frame_time) * self.smoothing
+        for name_id in set(self.averages) | set(self.frame_self_times):
+            average = self.averages.get(name_id, 0.0)
+            self.averages[name_id] = average + (self.frame_self_times.get(name_id, 0.0) - average) * self.smoothing
+
+        if self.last_frame_time > self.frame_budget and self.frame_self_times:
+            culprit = max(self.frame_self_times, key=self.frame_self_times.get)
+            logger.warning("Frame %d took %.1f ms (budget %.1f ms), mostly in %s (%.1f ms)",
+                           self.frame_number, self.last_frame_time * 1000, self.frame_budget * 1000,
+                           self.names[culprit], self.frame_self_times[culprit] * 1000)
+
+        self.frame_number += 1
+
+    def recorded(self) -> range:
+        """Ring buffer slots in the order they were written"""
+        if self.written <= self.capacity:
+            return range(self.written)
+        first = self.written % self.capacity
+        return range(first, first + self.capacity)
+
+    def export_chrome_trace(self, fname: str):
+        """Write the sections still in the ring buffer as Chrome trace-event JSON"""
+        events = []
+        for slot in self.recorded():
+            i = slot % self.capacity
+            events.append({
+                "name": self.names[self.name_ids[i]],
+                "ph": "X",
+                "ts": float(self.starts[i]) * 1e6,
+                "dur": float(self.durations[i]) * 1e6,
+                "pid": 0,
+                "tid": 0,
+                "args": {"frame": int(self.frames[i])},
+            })
+
+        with open(fname, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def draw_overlay(self, surface: pygame.Surface, position=(4, 4)) -> pygame.Rect | None:
+        """Draw the frame time and the most expensive sections, returning the area that was drawn to"""
+        if not self.show_overlay:
+            return None
+
+        if self.font is None:
+            self.font = fonts.get_font(None, Profiler.overlay_font_size)
+
+        lines = [f"frame {self.average_frame_time * 1000:5.1f} ms"]
+        slowest = sorted(self.averages, key=self.averages.get, reverse=True)[:Profiler.overlay_lines]
+        lines += [f"{self.averages[name_id] * 1000:5.2f} {self.names[name_id]}" for name_id in slowest]
+
+        rendered = [self.font.render(line, True, (255, 255, 255), (0, 0, 0)) for line in lines]
+        rect = pygame.Rect(position, (max(text.get_width() for text in rendered), sum(text.get_height() for text in rendered)))
+        y = rect.top
+        for text in rendered:
+            surface.blit(text, (rect.left, y))
+            y += text.get_height()
+        return rect
+
+def process_age() -> float | None:
+    """Seconds since the process started, if the OS can tell us. Only accurate to a clock tick, usually 10 ms."""
+    try:
+        with open("/proc/self/stat") as f:
+            # The fields after the command name, which is in parentheses and can have spaces in it
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class StartupTimer:
+    """Times each phase of starting up, from the process starting to the first frame being on screen"""
+
+    def __init__(self, start: float | None = None):
+        now = time.perf_counter()
+        age = process_age()
+        if age is not None:
+            self.marks = [("process start", now - age)]
+        else:
+            # Without the process start time the report starts from `start`, or now
+            self.marks = [("start", now if start is None else start)]
+
+    def mark(self, phase: str, at: float | None = None):
+        """Record that `phase` ended now, or at `at`"""
+        self.marks.append((phase, time.perf_counter() if at is None else at))
+
+    @property
+    def total(self) -> float:
+        return self.marks[-1][1] - self.marks[0][1]
+
+    def report(self) -> str:
+        lines = [f"startup from {self.marks[0][0]}:"]
+        for (_, last), (phase, at) in zip(self.marks, self.marks[1:]):
+            lines.append(f"  {phase:<16}{(at - last) * 1000:7.1f} ms {(at - self.marks[0][1]) * 1000:7.1f} ms")
+        return "\n".join(lines)
@@ -1,10 +1,10 @@
 import math
-import random
+import typing
 import pygame
 import window
-import dialogue_handler
-import helpers
-import particle
+
+if typing.TYPE_CHECKING:
+    import input_router
 
 class Program:
     """A program is something that is launchable and has an icon that lives on the desktop"""
@@ -13,6 +13,9 @@ class Program:
     launch_interval = 0.05
     close_time = 0.5
 
+    # Programs sharing an icon share its selection overlay too
+    selected_overlays: dict[pygame.Surface, pygame.Surface] = {}
+
     def __init__(self, icon: pygame.Surface, position: pygame.Vector2 = pygame.Vector2(), name: str="Program", size: pygame.Vector2=(250, 300)):
         self.icon = icon
         self.position: pygame.Vector2 = position
@@ -24,14 +27,25 @@ class Program:
         self.open_timer = 0
         self.closing = False
         self.closing_timer = 0
+        # Where the open or close animation's outline goes this frame, worked out by `place_animations`
+        self.animation_rect: pygame.FRect | None = None
 
         self.window_size: pygame.Vector2 = size
         self.window_name = name
         self.window = window.Window(self.window_size, pygame.Vector2(100, 100), self.window_name)
 
         # When an icon is selected, shade the visible parts a blue color
-        img_mask = pygame.mask.from_surface(self.icon)
-        self.selected_overlay = img_mask.to_surface(setcolor=(0, 50, 200, 255), unsetcolor=(255, 255, 255, 255))
+        self.selected_overlay = Program.selected_overlays.get(self.icon)
+        if self.selected_overlay is None:
+            img_mask = pygame.mask.from_surface(self.icon)
+            self.selected_overlay = img_mask.to_surface(setcolor=(0, 50, 200, 255), unsetcolor=(255, 255, 255, 255))
+            Program.selected_overlays[self.icon] = self.selected_overlay
+
+        # Areas of the desktop this program needs redrawn, collected by the desktop once per frame. Changes to the
+        # icon or the window's placement are detected automatically by comparing against the last collected state.
+        self.dirty_rects: list[pygame.Rect] = []
+        self.last_visual_state = None
+        self.last_footprint: pygame.Rect | None = None
 
     def update(self, delta: float):
         # Opening animation timer update
@@ -49,6 +63,39 @@ class Program:
 
         self.window.update(delta)
 
+    @property
+    def footprint(self) -> pygame.Rect | None:
+        """The area of the desktop covered by the window or its open/close animation, if any"""
+        if self.open:
+            return self.window.outer_rect
+        if self.opening or self.closing:
+            # The animated rect moves between the icon and the window so it always stays within both of them
+            return self.window.outer_rect.union(self.icon_rect)
+        return None
+
+    def mark_dirty(self, rect: pygame.Rect):
+        self.dirty_rects.append(pygame.Rect(rect))
+
+    def collect_dirty_rects(self) -> list[pygame.Rect]:
+        """Return every area that changed since the last call and reset the list"""
+        footprint = self.footprint
+        state = (self.selected, self.open, self.opening, self.closing, self.window.focused, None if footprint is None else tuple(footprint))
+
+        # The animations change every few frames, so just redraw them the whole time they are playing
+        if state != self.last_visual_state or self.opening or self.closing:
+            self.dirty_rects.append(self.icon_rect)
+            if self.last_footprint is not None:
+                self.dirty_rects.append(self.last_footprint)
+            if footprint is not None:
+                self.dirty_rects.append(footprint)
+
+        self.last_visual_state = state
+        self.last_footprint = footprint
+
+        rects = self.dirty_rects
+        self.dirty_rects = []
+        return rects
+
     def draw_icon(self, surface: pygame.Surface):
         surface.blit(self.icon, self.icon_rect)
 
@@ -56,25 +103,30 @@ class Program:
         if self.selected:
             surface.blit(self.selected_overlay, self.icon_rect, special_flags=pygame.BLEND_MULT)
 
-    def draw_window(self, surface: pygame.Surface):
+    def animation_frame(self) -> tuple[tuple[float, ...], tuple[float, ...], float] | None:
+        """The rects the open or close animation goes from and to as (x, y, width, height), and how far along it
+        is, or None if it isn't animating"""
         if self.opening:
             # animate a rect going from the program to the size of the window
             # Limit it to make the animation more choppy (only updates every `launch_interval` seconds)
             t = (self.open_timer - math.fmod(self.open_timer, self.launch_interval)) / Program.launch_time
-            rect_width = pygame.math.lerp(self.icon.width, self.window.size.x, t)
-            rect_height = pygame.math.lerp(self.icon.height, self.window.size.y, t)
-            rect_pos = self.position + (self.window.position - self.position) * t
-            pygame.draw.rect(surface, (30, 30, 30), pygame.rect.FRect(rect_pos, (rect_width, rect_height)), 1)
-        
-        elif self.closing:
+            return (*self.position, *self.icon.size), (*self.window.position, *self.window.size), t
+
+        if self.closing:
             # animate a rect going from the window to the size of the program
             # Limit it to make the animation more choppy
             t = (self.closing_timer - math.fmod(self.closing_timer, self.launch_interval)) / Program.close_time
-            rect_width = pygame.math.lerp(self.window.size.x, self.icon.width, t)
-            rect_height = pygame.math.lerp(self.window.size.y, self.icon.height, t)
-            rect_pos = self.window.position + (self.position - self.window.position) * t
-            pygame.draw.rect(surface, (30, 30, 30), pygame.rect.FRect(rect_pos, (rect_width, rect_height)), 1)
-        
+            return (*self.window.position, *self.window.size), (*self.position, *self.icon.size), t
+
+        return None
+
+    def draw_window(self, surface: pygame.Surface, alpha: float = 1.0):
+        """Draw the window and its contents. `alpha` is how far the render is between the last two updates."""
+        if self.opening or self.closing:
+            if self.animation_rect is None:
+                place_animations([self])
+            pygame.draw.rect(surface, (30, 30, 30), self.animation_rect, 1)
+
         else:
             self.window.draw(surface)
 
@@ -82,283 +134,59 @@ class Program:
         self.opening = True
         self.open_timer = 0
 
-    def handle_input(self):
-        if pygame.mouse.get_pressed()[0] and self.open and self.window.check_close(pygame.mouse.get_pos()):
+    def handle_pointer(self, event: "input_router.PointerEvent"):
+        """Handle a mouse event on this program's window, sent by the desktop's input router"""
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.open and self.window.check_close(event.pos):
             self.close_program()
 
     def close_program(self):
         self.open = False
         self.closing = True
         self.closing_timer = 0
-
-class ChatSupport(Program):
-
-    def __init__(self, icon: pygame.Surface):
-        Program.__init__(self, icon, pygame.Vector2(20, 25), "Interconnect Chat", pygame.Vector2(250, 300))
-        self.setup_done = False
-        
-    def setup(self):
-        self.dialogue_handler = dialogue_handler.DialogueHandler("dialogue.txt")
-        self.chat_window = pygame.Surface(self.window.content_rect.size)
-        self.setup_done = True
-        
-    def update(self, delta: float):
-        super().update(delta)
-        if not self.setup_done:
-            self.setup()
-        
-    def draw_window(self, surface: pygame.Surface):
-        super().draw_window(surface)
-        if self.open:
-            self.chat_window.fill((0, 0, 0))
-            self.dialogue_handler.draw_text(self.chat_window, pygame.rect.Rect((0, 0), self.chat_window.size))
-        
-            surface.blit(self.chat_window, self.window.content_rect)
-
-class LaserCommand(Program):
-
-    def __init__(self, icon: pygame.Surface):
-        Program.__init__(self, icon, pygame.Vector2(20, 100), "Laser Command", pygame.Vector2(300, 400))
-
-        self.game_window = pygame.Surface(self.window.content_rect.size)
-        self.setup_done = False
-        
-    def setup(self):
-        self.sky_color = helpers.random_hue(80, 80)
-        self.ground_color = helpers.random_hue(80, 50)
-        
-        self.ground_rect = self.game_window.get_rect()
-        self.ground_rect.top += self.game_window.height * 0.9
-        self.ground_rect.height *= 0.10
-        
-        self.asteroid_position = pygame.Vector2(random.randint(0, int(self.window.size.x)), 0)
-        self.asteroid_goal = pygame.Vector2(random.randint(int(self.window.size.x * 0.25), int(self.window.size.x * 0.75)), self.window.size.y)
-
-        self.asteroid_speed = 25
-        self.asteroid_image = pygame.image.load("res/imgs/asteroid.png").convert_alpha()
-        self.asteroid_size = self.asteroid_image.get_width() / 2
-        self.asteroid_destroyed = False
-
-        self.asteroid_rect = self.asteroid_image.get_rect()
-        self.asteroid_mask = pygame.mask.from_surface(self.asteroid_image)
-        self.asteroid_mask_max = self.asteroid_mask.count()
-
-        self.exploding = False
-        self.explosion_timer = 0.0
-        self.explosion_length = 5.0
-        self.explosion_surf = pygame.Surface(self.game_window.size, flags=pygame.BLEND_ADD)
-
-        self.alive = True
-        
-        self.setup_done = True
-        
-        self.asteroid_particles: list[particle.Particle] = []
-        self.explosion_particles: list[particle.Particle] = []
-        self.particle_interval = 0.05
-        self.last_particle_time = 0.0
-        
-        self.last_laser_time = 0.0
-        self.laser_interval = 0.5
-        self.laser_draw_time = 0.5
-        self.firing = False
-        self.laser_target = pygame.Vector2()
-        
-        # The laser will blast chunks out of the asteroid and we will use masks to cut away
-        self.laser_explosion_radius = 16
-        laser_explosion_size = self.laser_explosion_radius * 2 + 1
-        
-        # Make a circular mask
-        self.laser_explosion_mask = pygame.mask.Mask((laser_explosion_size, laser_explosion_size))
-        for x in range(laser_explosion_size):
-            for y in range(laser_explosion_size):
-                x_diff = x - self.laser_explosion_radius
-                y_diff = y - self.laser_explosion_radius
-                if x_diff * x_diff + y_diff * y_diff <= self.laser_explosion_radius * self.laser_explosion_radius:
-                    self.laser_explosion_mask.set_at((x, y))
-        
-
-    @staticmethod
-    def draw_reticle(surface: pygame.Surface, location: pygame.Vector2):
-        reticle_scale = 15
-        corner_angle = math.radians(30)
-        corner_offset = math.radians(120)
-        corner_1 = pygame.Vector2(math.cos(corner_angle), math.sin(corner_angle)) * reticle_scale + location
-        corner_2 = pygame.Vector2(math.cos(corner_angle + corner_offset), math.sin(corner_angle + corner_offset)) * reticle_scale + location
-        corner_3 = pygame.Vector2(math.cos(corner_angle - corner_offset), math.sin(corner_angle - corner_offset)) * reticle_scale + location
-
-        pygame.draw.polygon(surface, (220, 30, 30), [corner_1, corner_2, corner_3], 3)
-
-    def handle_input(self):
-        super().handle_input()
-    
-        # Fire the laser if we are clicking on the window and we haven't fired the laser recently
-        if pygame.mouse.get_just_pressed()[0] and self.window.content_rect.collidepoint(pygame.mouse.get_pos()):
-            if self.last_laser_time + self.laser_interval < self.window.open_timer:
-                self.last_laser_time = self.window.open_timer
-                self.firing = True
-                self.laser_target = pygame.Vector2(pygame.mouse.get_pos()) - pygame.Vector2(self.window.content_rect.topleft)
-                
-                if self.check_asteroid_laser_collision():
-                    self.handle_asteroid_laser_collision()
-                
-
-    def update(self, delta: float):
-        if not self.setup_done:
-            self.setup()
-
-        Program.update(self, delta)
-        if self.open:
-            
-            # Asteroid only moves and creates a trail if it hasn't impacted
-            if self.alive and not self.asteroid_destroyed:
-                self.asteroid_position += (self.asteroid_goal - self.asteroid_position).normalize() * self.asteroid_speed * delta
-                self.asteroid_rect.center = self.asteroid_position
-
-                # Check if the asteroid has impacted the ground
-                if self.asteroid_position.y > self.game_window.get_rect().height - self.asteroid_size * 1.5:
-                    self.exploding = True
-                    self.explode_time = self.window.open_timer
-                    self.alive = False
-                    
-                    # Add a bunch of particles right at the end
-                    for _ in range(50):
-                        self.add_asteroid_particle()
-
-                    # Make all the particles move away from the asteroid
-                    for p in self.asteroid_particles:
-                        vec_to_asteroid = (self.asteroid_position - p.position)
-                        p.velocity = (-vec_to_asteroid / vec_to_asteroid.magnitude()) * 100
-                        p.lifetime = self.explosion_length
-                
-                # Add new particles every `particle_intervial` seconds
-                if self.last_particle_time + (self.particle_interval / self.check_asteroid_percentage()) < self.window.open_timer:
-                    self.last_particle_time = self.window.open_timer
-                    self.add_asteroid_particle()
-                
-            # Update all asteroids
-            for p in self.asteroid_particles:
-                p.update(delta)
-                
-            for p in self.explosion_particles:
-                p.update(delta)
-                
-            if self.firing and self.window.open_timer > self.last_laser_time + self.laser_draw_time:
-                self.firing = False
-
-            # Explosion animation
-            if self.exploding:
-                self.explosion_timer += delta
-                self.exploding = self.explosion_timer < self.explosion_length
-            
-            # Remove any particles that are too old
-            self.clean_up_particles()
-
-        # If we have already died once and are now reopening the window, set it back up. Mostly for testing purposes.
-        if not self.alive and self.opening:
-            self.setup()
-            
-    def add_asteroid_particle(self):
-        # Create and return a new particle moving away from the asteroid
-        new_particle = particle.Particle(self.asteroid_position.copy() + helpers.random_vector2(8) - pygame.Vector2(0, 8), helpers.random_vector2(5), size_start=5, size_end=25, lifetime=2.0, colorstart=(200, 100, 20))
-        self.asteroid_particles.append(new_particle)
-        return new_particle
-    
-    def add_explosion_particle(self):
-        new_particle = particle.Particle(self.laser_target.copy(), helpers.random_vector2(30), 16, 4, 1, (80, 52, 34))
-        self.explosion_particles.append(new_particle)
-        return new_particle
-    
-    def clean_up_particles(self):
-        # Filter out any particles that are no longer alive. This probably isn't the most efficient way to do this
-        self.asteroid_particles = list(filter(lambda particle: particle.isalive, self.asteroid_particles))
-        self.explosion_particles = list(filter(lambda particle: particle.isalive, self.explosion_particles))
-        
-    def draw_laser(self):
-        # Draw the laser going from the base to the mouse cursor
-        window_rect = self.game_window.get_rect()
-        laser_base_height = self.ground_rect.height / 2
-        base_position = pygame.Vector2(window_rect.width / 2, window_rect.bottom - laser_base_height)
-        
-        # Laser ratio is the percentage we are through the animation
-        laser_ratio = (self.window.open_timer - self.last_laser_time) / self.laser_draw_time
-        
-        # Laser gets slightly darker and thinner as the animation plays
-        laser_color = helpers.lerp_rgb((255, 0, 0), (200, 0, 0), laser_ratio)
-        laser_width = int(pygame.math.lerp(5, 1, laser_ratio))
-        
-        pygame.draw.line(self.game_window, laser_color, base_position, self.laser_target, laser_width)
-
-    def handle_asteroid_laser_collision(self):
-        offset = (self.laser_target - pygame.Vector2(self.laser_explosion_radius, self.laser_explosion_radius)) - (self.asteroid_position - pygame.Vector2(self.asteroid_size, self.asteroid_size))
-        self.asteroid_mask.erase(self.laser_explosion_mask, offset)
-        
-        for _ in range(8):
-            self.add_explosion_particle()
-        
-        # Remove the smallest chunk of the asteroid if two parts get separated
-        self.asteroid_mask = self.asteroid_mask.connected_component()
-
-        # Check if we've fully destroyed the asteroid
-        self.asteroid_destroyed = self.check_asteroid_destroyed()
-        
-    def check_asteroid_laser_collision(self):
-        laser_explosion_topleft = self.laser_target - pygame.Vector2(self.laser_explosion_mask.get_size()) / 2
-        asteroid_topleft = pygame.Vector2(self.asteroid_rect.topleft)
-        offset = laser_explosion_topleft - asteroid_topleft
-        return self.asteroid_mask.overlap(self.laser_explosion_mask, offset) is not None
-        # return (self.asteroid_position - self.laser_target).magnitude() < self.asteroid_size
-    
-    def check_asteroid_percentage(self):
-        return self.asteroid_mask.count() / self.asteroid_mask_max
-
-    def check_asteroid_destroyed(self):
-        return self.check_asteroid_percentage() < 0.05
-
-    def draw_asteroid(self):
-        return self.asteroid_mask.to_surface(None, self.asteroid_image, None, None, (0, 0, 0, 0))
-
-    def draw_window(self, surface: pygame.Surface):
-        Program.draw_window(self, surface)
-
-        if self.open:
-            if self.alive or self.exploding:
-                # Draw sky
-                self.game_window.fill(self.sky_color)
-                
-                # Draw the ground
-                pygame.draw.rect(self.game_window, self.ground_color, self.ground_rect)
-
-                # Draw asteroid particles
-                for particle in self.asteroid_particles:
-                    particle.draw(self.game_window)
-                    
-                if self.firing:
-                    self.draw_laser()
-
-                # Draw asteroid
-                # self.game_window.blit(self.asteroid_image, self.asteroid_rect)
-                self.game_window.blit(self.draw_asteroid(), self.asteroid_rect)
-                
-                # Draw explosion particles
-                for particle in self.explosion_particles:
-                    particle.draw(self.game_window)
-                
-                if self.exploding:
-                    # Draw the growing explosion
-                    explode_ratio = self.explosion_timer / self.explosion_length
-                    pygame.draw.circle(self.game_window, pygame.colordict.THECOLORS['white'], self.asteroid_position, pygame.math.lerp(self.asteroid_size, self.asteroid_size * 5, explode_ratio))
-
-                    # The explosion surface slowly makes the screen more and more white
-                    self.explosion_surf.fill(helpers.lerp_rgb((0, 0, 0), (255, 255, 255), explode_ratio))
-                    self.game_window.blit(self.explosion_surf, (0, 0), special_flags=pygame.BLEND_ADD)
-
-                else:
-                    # Reticle, don't draw during explosion
-                    LaserCommand.draw_reticle(self.game_window, pygame.Vector2(pygame.mouse.get_pos()) - pygame.Vector2(self.window.content_rect.topleft))
-
-            else:
-                # Draw a "lost connection" screen
-                self.window.draw_fuzzy_screen(self.game_window)
-
-            # Draw the final window onto the screen
-            surface.blit(self.game_window, self.window.content_rect)
+        self.release_surfaces()
+
+    def release_surfaces(self):
+        """Give surfaces that are only needed while the window is open back to the pool"""
+        self.window.release_surfaces()
+
+    def surface_bytes(self) -> dict[str, int]:
+        """Memory held by this program's own surfaces, by what they're for. Shared icons and caches aren't counted."""
+        return {"window": self.window.surface_bytes()}
+
+    def state_summary(self) -> dict:
+        """A plain snapshot of the program's state, for checking replays against their recordings"""
+        return {
+            "name": self.window_name,
+            "selected": self.selected,
+            "open": self.open,
+            "opening": self.opening,
+            "closing": self.closing,
+            "focused": self.window.focused,
+            "window_position": [self.window.position.x, self.window.position.y],
+        }
+
+def place_animations(programs: list[Program]):
+    """Work out the animation rects of every program playing its open or close animation, all in one batch"""
+    animating = []
+    for cur_program in programs:
+        cur_program.animation_rect = None
+        frame = cur_program.animation_frame()
+        if frame is not None:
+            animating.append((cur_program, frame))
+    if not animating:
+        return
+
+    # Only imported once something animates, which is when a program's loaded and needs NumPy anyway
+    import numpy as np
+    import affine
+
+    starts = np.array([start for _, (start, _, _) in animating])
+    ends = np.array([end for _, (_, end, _) in animating])
+    t = np.array([t for _, (_, _, t) in animating])[:, None]
+    rects = starts + (ends - starts) * t
+
+    # Each outline is the unit square scaled to the rect's size and moved to its position
+    matrices = affine.translations(rects[:, :2]) @ affine.scalings(rects[:, 2:])
+    corners = affine.apply_each(matrices, affine.rect_corners(np.tile((0, 0, 1, 1), (len(animating), 1))))
+    for (cur_program, _), (top_left, _, bottom_right, _) in zip(animating, corners.tolist()):
+        cur_program.animation_rect = pygame.FRect(top_left, (bottom_right[0] - top_left[0], bottom_right[1] - top_left[1]))
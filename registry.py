@@ -0,0 +1,73 @@
+"""Every program that can go on the desktop, and stand-ins that put their icons there without loading them.
+
+A program's module isn't imported and the program isn't built until its icon is launched for the first time. Until
+then a `ProgramLauncher` shows the icon from what's declared in its `ProgramEntry`, so starting up doesn't pay for
+programs that never get opened.
+"""
+
+import importlib
+import logging
+import time
+import pygame
+import assets
+import program
+
+logger = logging.getLogger(__name__)
+
+class ProgramEntry:
+    """Where to find a program and what its icon looks like before it's loaded.
+
+    The icon position, name and window size are the program's own, its class gets them from here with `entry` too,
+    so nothing moves when the launcher is swapped for the real thing. `options` are passed on to the class as
+    keyword arguments when it's created.
+    """
+
+    def __init__(self, module_name: str, class_name: str, icon_key: str, position: tuple[int, int], name: str, window_size: tuple[int, int],
+                 options: dict | None = None):
+        self.module_name = module_name
+        self.class_name = class_name
+        self.icon_key = icon_key
+        self.position = position
+        self.name = name
+        self.window_size = window_size
+        self.options = options or {}
+
+    def load(self) -> type[program.Program]:
+        return getattr(importlib.import_module(self.module_name), self.class_name)
+
+    def create(self) -> program.Program:
+        start = time.perf_counter()
+        cur_program = self.load()(assets.get_image(self.icon_key), **self.options)
+        logger.info("loaded %s in %.1f ms", self.name, (time.perf_counter() - start) * 1000)
+        return cur_program
+
+# Everything on the desktop, in the order the icons are added
+entries: list[ProgramEntry] = [
+    ProgramEntry("chat_support", "ChatSupport", "imgs/ChatIcon", (20, 25), "Interconnect Chat", (250, 300)),
+    ProgramEntry("laser_command", "LaserCommand", "imgs/LaserIcon", (20, 100), "Laser Command", (300, 400)),
+]
+
+def register(entry: ProgramEntry):
+    entries.append(entry)
+
+def entry(class_name: str) -> ProgramEntry:
+    """The entry of a program class"""
+    for cur_entry in entries:
+        if cur_entry.class_name == class_name:
+            return cur_entry
+    raise KeyError(f"no program {class_name!r} is registered")
+
+def configure(class_name: str, **options):
+    """Set options for a program class, used from then on whenever it's created"""
+    entry(class_name).options.update(options)
+
+class ProgramLauncher(program.Program):
+    """Stands in for a program that hasn't been loaded yet. It can be selected like any icon, and the desktop
+    replaces it with the real program when it's launched."""
+
+    def __init__(self, entry: ProgramEntry):
+        program.Program.__init__(self, assets.get_image(entry.icon_key), pygame.Vector2(entry.position), entry.name, pygame.Vector2(entry.window_size))
+        self.entry = entry
+
+def launchers() -> list[ProgramLauncher]:
+    return [ProgramLauncher(entry) for entry in entries]
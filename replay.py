@@ -0,0 +1,228 @@
+"""Records a session's input to a compact binary log, and plays logs back headless as fast as possible.
+
+A recording has the random seed and wave size, and for every frame how long it took and the events it got. Playing it back goes
+through the same `game.new_game` and `game.simulate_frame` as the game itself, so it ends up in exactly the same
+state, which is checked against the state saved at the end of the recording:
+
+    python main.py --record session.rec
+    python replay.py session.rec                       # play it back and check the end state
+    python replay.py session.rec --trace trace.json    # and profile it
+
+File layout (little endian):
+
+    header   magic, version, seed: uint64, wave size: uint32
+    frames   frame time: float64, event count: uint16, late event count: uint16, then the events and late events
+             (the pointer events picked up after the simulation steps), each
+             type: uint32, x, y, rel x, rel y: int16, button or key: int32
+    footer   a frame time of -1, then the length (uint32) and UTF-8 JSON of the game state at the end
+"""
+
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+import time
+from collections.abc import Iterator
+import pygame
+import desktop
+import game
+import profiler
+import simulation_worker
+
+MAGIC = b"ITSR"
+VERSION = 2
+
+HEADER = struct.Struct("<4sHQI")
+FRAME = struct.Struct("<dHH")
+EVENT = struct.Struct("<Ihhhhi")
+LENGTH = struct.Struct("<I")
+
+# Everything else in the event queue makes no difference to the game
+RECORDED_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.KEYDOWN, pygame.KEYUP, pygame.QUIT)
+
+class ReplayError(ValueError):
+    pass
+
+def clamp16(value: float) -> int:
+    return min(max(int(value), -32768), 32767)
+
+def pack_event(event: pygame.Event) -> bytes:
+    x, y = getattr(event, "pos", (0, 0))
+    rel_x, rel_y = getattr(event, "rel", (0, 0))
+    code = getattr(event, "button", getattr(event, "key", 0))
+    return EVENT.pack(event.type, clamp16(x), clamp16(y), clamp16(rel_x), clamp16(rel_y), code)
+
+def unpack_event(data: bytes, offset: int) -> pygame.Event:
+    event_type, x, y, rel_x, rel_y, code = EVENT.unpack_from(data, offset)
+    if event_type == pygame.MOUSEMOTION:
+        return pygame.Event(event_type, pos=(x, y), rel=(rel_x, rel_y), buttons=(0, 0, 0))
+    if event_type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+        return pygame.Event(event_type, pos=(x, y), button=code)
+    if event_type in (pygame.KEYDOWN, pygame.KEYUP):
+        return pygame.Event(event_type, key=code)
+    return pygame.Event(event_type)
+
+def game_state(its_desktop: desktop.Desktop) -> dict:
+    """What a replay has to reproduce: the state of every program, in window order"""
+    return {"programs": [cur_program.state_summary() for cur_program in its_desktop.programs]}
+
+class Recorder:
+
+    def __init__(self, fname: str, seed: int, wave_size: int = 1):
+        self.file = open(fname, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, wave_size))
+        self.frames = 0
+
+    def record_frame(self, frame_time: float, events: list[pygame.Event], late_events: list[pygame.Event]):
+        events = [event for event in events if event.type in RECORDED_EVENTS]
+        late_events = [event for event in late_events if event.type in RECORDED_EVENTS]
+
+        self.file.write(b"".join([FRAME.pack(frame_time, len(events), len(late_events)),
+                                  *(pack_event(event) for event in events),
+                                  *(pack_event(event) for event in late_events)]))
+        self.frames += 1
+
+    def close(self, state: dict):
+        encoded = json.dumps(state).encode("utf-8")
+        self.file.write(FRAME.pack(-1, 0, 0) + LENGTH.pack(len(encoded)) + encoded)
+        self.file.close()
+
+class Recording:
+    """A recording read back from a file"""
+
+    def __init__(self, fname: str):
+        with open(fname, "rb") as f:
+            self.data = f.read()
+
+        try:
+            magic, version, self.seed, self.wave_size = HEADER.unpack_from(self.data)
+        except struct.error as e:
+            raise ReplayError(f"{fname} is too short to be a recording") from e
+        if magic != MAGIC or version != VERSION:
+            raise ReplayError(f"{fname} is not a recording, or was recorded by a different version")
+
+        # Find the footer, counting the frames on the way
+        self.frame_count = 0
+        self.final_state: dict | None = None
+        offset = HEADER.size
+        while offset < len(self.data):
+            frame_time, event_count, late_count = FRAME.unpack_from(self.data, offset)
+            offset += FRAME.size
+            if frame_time < 0:
+                (length,) = LENGTH.unpack_from(self.data, offset)
+                offset += LENGTH.size
+                self.final_state = json.loads(self.data[offset:offset + length].decode("utf-8"))
+                break
+            offset += (event_count + late_count) * EVENT.size
+            self.frame_count += 1
+
+    def frames(self) -> Iterator[tuple[float, list[pygame.Event], list[pygame.Event]]]:
+        """Every frame's time, events and late events"""
+        offset = HEADER.size
+        for _ in range(self.frame_count):
+            frame_time, event_count, late_count = FRAME.unpack_from(self.data, offset)
+            offset += FRAME.size
+
+            events = [unpack_event(self.data, offset + i * EVENT.size) for i in range(event_count + late_count)]
+            offset += len(events) * EVENT.size
+            yield frame_time, events[:event_count], events[event_count:]
+
+def play(fname: str, trace_file: str | None = None, threaded_simulation: bool = False) -> dict:
+    """Play a recording back as fast as possible and report how it went"""
+    recording = Recording(fname)
+
+    # The worker only changes when things get simulated, so a recording plays out the same with it on or off
+    if threaded_simulation:
+        simulation_worker.enable()
+
+    # There's nothing to look at, so don't open a window. This has to be set before the display is created.
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(game.SCREEN_SIZE)
+    screen_rect = pygame.Rect(0, 0, *game.SCREEN_SIZE)
+
+    its_desktop, simulation_clock = game.new_game(recording.seed, deterministic=True, wave_size=recording.wave_size)
+
+    frame_profiler = None
+    if trace_file is not None:
+        frame_profiler = its_desktop.profiler = profiler.Profiler()
+
+    simulated = 0.0
+    start = time.perf_counter()
+    for frame_time, events, late_events in recording.frames():
+        if frame_profiler is not None:
+            frame_profiler.begin_frame()
+
+        game.simulate_frame(its_desktop, simulation_clock, frame_time, events)
+        its_desktop.handle_input(late_events)
+        # Drawing is replayed too since it's part of what gets profiled, and the static on lost connection screens
+        # takes from the same random numbers as the game
+        its_desktop.draw(screen, screen_rect, simulation_clock.alpha)
+        simulated += frame_time
+
+        if frame_profiler is not None:
+            frame_profiler.end_frame()
+    elapsed = time.perf_counter() - start
+
+    state = game_state(its_desktop)
+    # Round trip through JSON so it compares like the saved state does
+    state = json.loads(json.dumps(state))
+
+    if trace_file is not None:
+        frame_profiler.export_chrome_trace(trace_file)
+    pygame.quit()
+
+    return {
+        "frames": recording.frame_count,
+        "simulated": simulated,
+        "elapsed": elapsed,
+        "state": state,
+        "expected_state": recording.final_state,
+        "matches": recording.final_state is None or state == recording.final_state,
+    }
+
+def print_mismatch(state: dict, expected_state: dict):
+    programs = state["programs"]
+    expected_programs = expected_state["programs"]
+    if len(programs) != len(expected_programs):
+        print(f"  {len(programs)} programs, expected {len(expected_programs)}")
+    for program_state, expected_program_state in zip(programs, expected_programs):
+        for key in sorted(set(program_state) | set(expected_program_state)):
+            if program_state.get(key) != expected_program_state.get(key):
+                print(f"  {expected_program_state.get('name')}.{key}: {program_state.get(key)!r}, expected {expected_program_state.get(key)!r}")
+
+def run(argv: list[str] | None = None) -> bool:
+    parser = argparse.ArgumentParser(description="Play back a recorded session and check it ends up in the same state")
+    parser.add_argument("recording", help="a file recorded with main.py --record")
+    parser.add_argument("--trace", metavar="FILE", help="profile the replay and write a Chrome trace of the last frames to FILE")
+    parser.add_argument("--threaded-simulation", action="store_true", help="simulate particles on a background thread")
+    args = parser.parse_args(argv)
+
+    # The dialogue script is loaded relative to the repository root
+    recording = os.path.abspath(args.recording)
+    trace_file = None if args.trace is None else os.path.abspath(args.trace)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        result = play(recording, trace_file, args.threaded_simulation)
+    except ReplayError as e:
+        parser.error(str(e))
+
+    speedup = result["simulated"] / result["elapsed"] if result["elapsed"] > 0 else math.inf
+    print(f"{result['frames']} frames, {result['simulated']:.1f}s of play replayed in {result['elapsed']:.2f}s ({speedup:.1f}x)")
+
+    if result["expected_state"] is None:
+        print("no end state was recorded, the recording was cut short")
+    elif result["matches"]:
+        print("end state matches")
+    else:
+        print("end state does not match:")
+        print_mismatch(result["state"], result["expected_state"])
+
+    return result["matches"]
+
+if __name__ == "__main__":
+    sys.exit(0 if run(sys.argv[1:]) else 1)
@@ -0,0 +1,142 @@
+"""Decides how often each program on the desktop gets updated.
+
+The focused program and any program playing its open or close animation are updated every step. Other open windows
+are updated at a lower rate with all the time they missed, and closed programs aren't updated at all. When a
+background program gets focused again it catches up on any time it still had pending.
+
+Background updates also draw from a CPU budget that's shared by all the updates between two frames. It's checked
+before every update step, and once it's spent the rest of the background programs, and the rest of the steps of the
+one being updated, wait and keep their pending time for later. So neither a pile of background windows nor one
+window catching up on a long stretch of time can push the frame over its deadline.
+"""
+
+import time
+import program
+
+FULL_RATE = "full"
+BACKGROUND = "background"
+SUSPENDED = "suspended"
+
+class ProgramClock:
+    """Scheduling state for one program"""
+
+    __slots__ = ("pending", "policy")
+
+    def __init__(self):
+        # Time that has passed since the program was last updated
+        self.pending = 0.0
+        self.policy = SUSPENDED
+
+class Scheduler:
+
+    def __init__(self, background_rate: float = 10, max_step: float = 0.1, max_pending: float = 1.0, budget: float = 0.004):
+        # How many times per second background programs get updated
+        self.background_rate = background_rate
+        # Catch-up time is handed out in steps no bigger than this, so nothing moves too far in one update
+        self.max_step = max_step
+        # Background programs that keep missing the budget don't build up more time than this, the rest is dropped
+        self.max_pending = max_pending
+
+        # Seconds of background updates allowed between two frames
+        self.budget = budget
+        self.spent = 0.0
+
+        self.clocks: dict[program.Program, ProgramClock] = {}
+
+        # Background programs are offered the budget round robin, so the same ones don't always miss out
+        self.next_background = 0
+
+    def clock(self, cur_program: program.Program) -> ProgramClock:
+        cur_clock = self.clocks.get(cur_program)
+        if cur_clock is None:
+            cur_clock = self.clocks[cur_program] = ProgramClock()
+        return cur_clock
+
+    @staticmethod
+    def policy(cur_program: program.Program) -> str:
+        if cur_program.opening or cur_program.closing or (cur_program.open and cur_program.window.focused):
+            return FULL_RATE
+        if cur_program.open:
+            return BACKGROUND
+        return SUSPENDED
+
+    def interpolated(self, cur_program: program.Program) -> bool:
+        """Whether a program is updated often enough for drawing between its last two updates to make sense"""
+        return self.clock(cur_program).policy == FULL_RATE
+
+    def end_frame(self):
+        self.spent = 0.0
+
+    def charge(self, seconds: float):
+        self.spent += seconds
+
+    def steps(self, pending: float) -> list[float]:
+        """Split pending time into update steps of at most `max_step`"""
+        steps = []
+        while pending > self.max_step:
+            steps.append(self.max_step)
+            pending -= self.max_step
+        if pending > 0:
+            steps.append(pending)
+        return steps
+
+    def due(self, programs: list[program.Program], delta: float) -> tuple[list[program.Program], list[program.Program]]:
+        """Add a step of `delta` seconds to every running program, and return the full rate programs and the
+        background programs that are due for an update, in the order they should be offered the budget"""
+        full_rate = []
+        background = []
+        for cur_program in programs:
+            cur_clock = self.clock(cur_program)
+            cur_clock.policy = Scheduler.policy(cur_program)
+
+            if cur_clock.policy == SUSPENDED:
+                cur_clock.pending = 0.0
+                continue
+
+            cur_clock.pending = min(cur_clock.pending + delta, self.max_pending)
+            if cur_clock.policy == FULL_RATE:
+                full_rate.append(cur_program)
+            elif cur_clock.pending >= 1 / self.background_rate - 1e-9:
+                background.append(cur_program)
+
+        # Forget about programs that were taken off the desktop
+        if len(self.clocks) > len(programs):
+            for cur_program in set(self.clocks).difference(programs):
+                del self.clocks[cur_program]
+
+        if background:
+            start = self.next_background % len(background)
+            background = background[start:] + background[:start]
+            self.next_background += 1
+
+        return full_rate, background
+
+    def take(self, cur_program: program.Program) -> list[float]:
+        """Hand out all of a program's pending time as update steps"""
+        cur_clock = self.clock(cur_program)
+        steps = self.steps(cur_clock.pending)
+        cur_clock.pending = 0.0
+        return steps
+
+    def run(self, programs: list[program.Program], delta: float, update):
+        """Advance the programs that are due by calling `update(program, delta)` for each of their steps"""
+        full_rate, background = self.due(programs, delta)
+
+        for cur_program in full_rate:
+            for step in self.take(cur_program):
+                update(cur_program, step)
+
+        for cur_program in background:
+            if self.spent >= self.budget:
+                break
+
+            steps = self.take(cur_program)
+            for i, step in enumerate(steps):
+                if self.spent >= self.budget:
+                    # The steps it didn't get to wait for a later frame
+                    self.clock(cur_program).pending = sum(steps[i:])
+                    break
+
+                start = time.perf_counter()
+                update(cur_program, step)
+                self.charge(time.perf_counter() - start)
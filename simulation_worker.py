@@ -0,0 +1,68 @@
+"""A background thread for simulation work that can overlap with the game thread.
+
+It's meant for batches of NumPy work, which releases the GIL while it crunches whole arrays, so the game thread can
+draw or update other programs in the meantime. Work is submitted as jobs that run one at a time in the order they
+were submitted. Anything that depends on a job's results waits for it first, so the outcome is exactly the same as
+running the job on the spot, only the timing changes.
+
+It's off unless `enable` is called before the programs that use it are set up.
+"""
+
+import queue
+import threading
+from collections.abc import Callable
+
+class Job:
+
+    __slots__ = ("function", "args", "done", "error")
+
+    def __init__(self, function: Callable, args: tuple):
+        self.function = function
+        self.args = args
+        self.done = threading.Event()
+        self.error: BaseException | None = None
+
+    def run(self):
+        try:
+            self.function(*self.args)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def wait(self):
+        """Wait for the job to finish, raising anything it raised"""
+        self.done.wait()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+class SimulationWorker:
+
+    def __init__(self):
+        self.jobs: queue.SimpleQueue[Job] = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.work, name="simulation", daemon=True)
+        self.thread.start()
+
+    def work(self):
+        while True:
+            self.jobs.get().run()
+
+    def submit(self, function: Callable, *args) -> Job:
+        job = Job(function, args)
+        self.jobs.put(job)
+        return job
+
+enabled = False
+worker: SimulationWorker | None = None
+
+def enable():
+    global enabled
+    enabled = True
+
+def shared() -> SimulationWorker | None:
+    """The worker everything shares, started the first time it's asked for, or None if it's off"""
+    global worker
+    if enabled and worker is None:
+        worker = SimulationWorker()
+    return worker
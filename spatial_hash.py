@@ -0,0 +1,49 @@
+"""Uniform grid broadphase for finding what might overlap an area without checking everything"""
+
+import pygame
+
+class SpatialHash:
+    """Buckets items by the grid cells their rects touch.
+
+    Queries only look at the cells the query rect touches, so their cost depends on how crowded that area is
+    rather than on the total number of items.
+    """
+
+    def __init__(self, cell_size: int):
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list] = {}
+
+    def cell_range(self, rect: pygame.Rect) -> tuple[range, range]:
+        return (range(rect.left // self.cell_size, (rect.right - 1) // self.cell_size + 1),
+                range(rect.top // self.cell_size, (rect.bottom - 1) // self.cell_size + 1))
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, item, rect: pygame.Rect):
+        columns, rows = self.cell_range(rect)
+        for x in columns:
+            for y in rows:
+                bucket = self.cells.get((x, y))
+                if bucket is None:
+                    self.cells[(x, y)] = [item]
+                else:
+                    bucket.append(item)
+
+    def rebuild(self, items):
+        """Replace the contents with `items`, each of which must have a `rect`"""
+        self.cells.clear()
+        for item in items:
+            self.insert(item, item.rect)
+
+    def query(self, rect: pygame.Rect) -> list:
+        """Every item in a cell touched by `rect`, each only once. These still need an exact check."""
+        found = {}
+        columns, rows = self.cell_range(rect)
+        for x in columns:
+            for y in rows:
+                bucket = self.cells.get((x, y))
+                if bucket is not None:
+                    for item in bucket:
+                        found[id(item)] = item
+        return list(found.values())
@@ -0,0 +1,34 @@
+"""Fixed timestep clock that decouples the simulation rate from the render rate"""
+
+class FixedTimestep:
+    """Accumulates real frame time and hands it out in fixed size simulation steps.
+
+    Whatever is left over after the last step is exposed as `alpha`, how far the render is between the previous
+    and the current simulation state. If the game falls too far behind, the backlog beyond `max_steps` is dropped
+    rather than trying to catch up, so one slow frame can't cause a spiral of ever slower frames.
+    """
+
+    def __init__(self, step: float = 1 / 30, max_steps: int = 5):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.dropped_time = 0.0
+
+    def advance(self, frame_time: float) -> int:
+        """Add a frame's worth of time and return how many simulation steps to run for it"""
+        self.accumulator += frame_time
+        steps = int(self.accumulator // self.step)
+
+        if steps > self.max_steps:
+            # Drop the whole steps we can't afford, but keep the fraction so alpha stays continuous
+            dropped = (steps - self.max_steps) * self.step
+            self.dropped_time += dropped
+            self.accumulator -= dropped
+            steps = self.max_steps
+
+        self.accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        return min(self.accumulator / self.step, 1.0)
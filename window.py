@@ -1,5 +1,11 @@
+import typing
 import pygame
+import fonts
 import helpers
+import memory
+
+if typing.TYPE_CHECKING:
+    import noise
 
 
 class Window:
@@ -10,86 +16,150 @@ class Window:
     def __init__(self, size: pygame.Vector2, position: pygame.Vector2, title: str, font: pygame.font.Font=None):
         self.size: pygame.Vector2 = size
         self.position: pygame.Vector2 = position
-        self.rect = pygame.rect.Rect(self.position, self.size)
-        self.title_bar_rect = pygame.rect.Rect(self.position, (self.rect.width, Window.title_bar_height))
 
         self.title = title
         self.font: pygame.font.Font = font
         if self.font is None:
             self.get_font()
 
-        self.title_bar_text = self.font.render(self.title, True, (0, 0, 0))
-        self.title_bar_text_rect = self.title_bar_text.get_rect(center = self.title_bar_rect.center)
-
-        self.content_rect = pygame.rect.Rect(self.position.x, self.position.y + Window.title_bar_height,
-                                             self.size.x, self.size.y - Window.title_bar_height)
+        self.focused = False
 
-        self.close_rect = pygame.rect.Rect(pygame.Vector2(self.title_bar_rect.right - Window.title_bar_height * 0.75,
-                                                          self.title_bar_rect.top + Window.title_bar_height // 4),
-                                           pygame.Vector2(Window.title_bar_height // 2, 
-                                                          Window.title_bar_height // 2))
+        # The border, title bar and close button only change with the size, title or focus, so they are rendered
+        # once to this image and re-rendered whenever one of those changes
+        self.chrome_image: pygame.Surface | None = None
+        self.chrome_key = None
+        self.rendered_title = None
         
-        self.overlay_image = pygame.Surface(self.size)
-        self.overlay_image.set_alpha(40)
-        
-        self.focused = False
+        # Geometry is rebuilt when the size changes and only moved when the position changes
+        self.last_size = None
+        self.last_position = None
+        self.update_geometry()
         
         self.open_timer = 0.0
         self.fuzzy_interval = 0.25
         self.fuzzy_time = 0.0
         self.fuzzy_size = 16 # size of fuzzy particles
+        self.fuzzy_frames = 8 # how many frames of static to cycle through, 0 to generate new static every time
+        self.fuzzy_noise: "noise.StaticNoise | None" = None
 
     def get_font(self):
         assert pygame.font.get_init()
 
-        self.font = pygame.font.SysFont(None, Window.title_bar_font_size)
+        self.font = fonts.get_font(None, Window.title_bar_font_size)
 
+    def update_geometry(self):
+        size = (self.size.x, self.size.y)
+        position = (self.position.x, self.position.y)
+
+        if size != self.last_size:
+            self.rect = pygame.rect.Rect(self.position, self.size)
+            self.title_bar_rect = pygame.rect.Rect(self.position, (self.rect.width, Window.title_bar_height))
+            self.content_rect = pygame.rect.Rect(self.position.x, self.position.y + Window.title_bar_height,
+                                                 self.size.x, self.size.y - Window.title_bar_height)
+            self.close_rect = pygame.rect.Rect(0, 0, Window.title_bar_height // 2, Window.title_bar_height // 2)
+            self.render_title()
+
+        elif position == self.last_position:
+            return
 
-    def update(self, delta: float):
         self.rect.topleft = self.position
         self.title_bar_rect.topleft = self.rect.topleft
         self.title_bar_text_rect.center = self.title_bar_rect.center
+        self.content_rect.topleft = (self.position.x, self.position.y + Window.title_bar_height)
+        self.close_rect.topleft = (self.title_bar_rect.right - Window.title_bar_height * 0.75,
+                                   self.title_bar_rect.top + Window.title_bar_height // 4)
+
+        self.last_size = size
+        self.last_position = position
 
-        self.close_rect = pygame.rect.Rect(pygame.Vector2(self.title_bar_rect.right - Window.title_bar_height * 0.75,
-                                                          self.title_bar_rect.top + Window.title_bar_height // 4),
-                                           pygame.Vector2(Window.title_bar_height // 2, 
-                                                          Window.title_bar_height // 2))
-                                                          
-        self.content_rect = pygame.rect.Rect(self.position.x, self.position.y + Window.title_bar_height,
-                                             self.size.x, self.size.y - Window.title_bar_height)
+    def render_title(self):
+        self.title_bar_text = fonts.text_cache.render(self.font, self.title, (0, 0, 0))
+        self.title_bar_text_rect = self.title_bar_text.get_rect(center = self.title_bar_rect.center)
+        self.rendered_title = self.title
+
+    def update(self, delta: float):
+        if self.title != self.rendered_title:
+            self.render_title()
+        self.update_geometry()
         
         self.open_timer += delta
 
-    def draw(self, surface: pygame.Surface):
+    def render_chrome(self):
+        """Render the border, title bar and close button onto the cached chrome image"""
         title_color = (240, 240, 240)
         background_color = helpers.adjust_brightness_rgb(*title_color, 0.9)
         close_color = (200, 40, 0)
 
+        # Everything is drawn relative to the window's top left. The bottom edge line sits just outside of the
+        # window rect, so the image is one pixel bigger than it and the unused pixels are made transparent.
+        rect = pygame.Rect((0, 0), self.rect.size)
+        title_bar_rect = self.title_bar_rect.move(-self.rect.left, -self.rect.top)
+        close_rect = self.close_rect.move(-self.rect.left, -self.rect.top)
+        title_bar_text_rect = self.title_bar_text_rect.move(-self.rect.left, -self.rect.top)
+
+        # The old image goes back to the pool first, so re-rendering at the same size reuses it
+        transparent_color = (255, 0, 255)
+        memory.pool.release(self.chrome_image)
+        self.chrome_image = memory.pool.acquire((rect.width + 1, rect.height + 1))
+        self.chrome_image.fill(transparent_color)
+
         # Outer border
-        pygame.draw.rect(surface, background_color, self.rect)
-        pygame.draw.line(surface, helpers.adjust_brightness_rgb(*background_color, 0.5), *helpers.bottom_edge_line(self.rect))
+        pygame.draw.rect(self.chrome_image, background_color, rect)
+        pygame.draw.line(self.chrome_image, helpers.adjust_brightness_rgb(*background_color, 0.5), *helpers.bottom_edge_line(rect))
 
         # Title bar
-        pygame.draw.rect(surface, title_color, self.title_bar_rect)
-        pygame.draw.line(surface, helpers.adjust_brightness_rgb(*title_color, 0.5), *helpers.bottom_edge_line(self.title_bar_rect))
+        pygame.draw.rect(self.chrome_image, title_color, title_bar_rect)
+        pygame.draw.line(self.chrome_image, helpers.adjust_brightness_rgb(*title_color, 0.5), *helpers.bottom_edge_line(title_bar_rect))
 
         # Title text
-        surface.blit(self.title_bar_text, self.title_bar_text_rect)
+        self.chrome_image.blit(self.title_bar_text, title_bar_text_rect)
 
         # Close Button
-        pygame.draw.rect(surface, close_color, self.close_rect)
-        pygame.draw.line(surface, helpers.adjust_brightness_rgb(*close_color, 0.5), *helpers.bottom_edge_line(self.close_rect))
+        pygame.draw.rect(self.chrome_image, close_color, close_rect)
+        pygame.draw.line(self.chrome_image, helpers.adjust_brightness_rgb(*close_color, 0.5), *helpers.bottom_edge_line(close_rect))
 
+        # Darken unfocused windows, the same as blending black over them at an alpha of 40
         if not self.focused:
-            surface.blit(self.overlay_image, self.rect)
+            self.chrome_image.fill((215, 215, 215), rect, special_flags=pygame.BLEND_MULT)
+
+        self.chrome_image.set_colorkey(transparent_color)
+
+        self.chrome_key = (self.rect.size, self.rendered_title, self.focused)
+
+    def draw(self, surface: pygame.Surface):
+        if self.chrome_key != (self.rect.size, self.rendered_title, self.focused):
+            self.render_chrome()
+
+        surface.blit(self.chrome_image, self.rect)
+
+    def release_surfaces(self):
+        """Give the rendered chrome back to the pool, it's rendered again the next time the window is drawn"""
+        memory.pool.release(self.chrome_image)
+        self.chrome_image = None
+        self.chrome_key = None
+
+    def surface_bytes(self) -> int:
+        noise_bytes = 0 if self.fuzzy_noise is None else self.fuzzy_noise.surface_bytes()
+        return memory.surface_bytes(self.chrome_image) + noise_bytes
+
+    @property
+    def outer_rect(self) -> pygame.Rect:
+        """The window rect including the bottom edge line, which is drawn just outside of it"""
+        return pygame.Rect(self.rect.left, self.rect.top, self.rect.width + 1, self.rect.height + 1)
+
+    @property
+    def fuzzy_pending(self) -> bool:
+        return self.open_timer - self.fuzzy_time > self.fuzzy_interval
 
     def draw_fuzzy_screen(self, surface: pygame.Surface):
-        if self.open_timer - self.fuzzy_time > self.fuzzy_interval:
+        if self.fuzzy_pending:
             self.fuzzy_time = self.open_timer
 
-            for x in range((self.content_rect.width // self.fuzzy_size) + 1):
-                for y in range((self.content_rect.height // self.fuzzy_size) + 1):
-                    pygame.draw.rect(surface, helpers.random_gray(), (x * self.fuzzy_size, y * self.fuzzy_size, self.fuzzy_size, self.fuzzy_size))
+            # Noise needs NumPy, which is slow to import and only needed once a connection is lost
+            import noise
+            if self.fuzzy_noise is None or (self.fuzzy_noise.tile_size, self.fuzzy_noise.frame_count) != (self.fuzzy_size, self.fuzzy_frames):
+                self.fuzzy_noise = noise.StaticNoise(self.fuzzy_size, frame_count=self.fuzzy_frames)
+            self.fuzzy_noise.draw(surface)
 
 
     def check_close(self, pos: pygame.Vector2) -> bool: